@@ -0,0 +1,173 @@
+from typing import List, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix, issparse, vstack
+
+WORD = 64
+PACKED_DENSITY = 0.25
+
+if hasattr(np, "bitwise_count"):
+
+    def _popcount(words: np.ndarray) -> int:
+        return int(np.bitwise_count(words).sum(dtype=np.int64))
+
+else:
+
+    def _popcount(words: np.ndarray) -> int:
+        return int(np.unpackbits(words.view(np.uint8)).sum(dtype=np.int64))
+
+
+class BitMatrix:
+    """
+    Boolean matrix with every row packed into `uint64` words,
+    column `j` is bit `j % 64` of word `j // 64`
+    """
+
+    def __init__(self, words: np.ndarray, n_cols: int):
+        self.words = words
+        self.n_cols = n_cols
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.words.shape[0], self.n_cols
+
+    @staticmethod
+    def zeros(n_rows: int, n_cols: int) -> "BitMatrix":
+        n_words = (n_cols + WORD - 1) // WORD
+        return BitMatrix(np.zeros((n_rows, n_words), dtype=np.uint64), n_cols)
+
+    @staticmethod
+    def from_sparse(matrix) -> "BitMatrix":
+        result = BitMatrix.zeros(*matrix.shape)
+        rows, cols = matrix.nonzero()
+        bits = np.left_shift(np.uint64(1), (cols % WORD).astype(np.uint64))
+        np.bitwise_or.at(result.words, (rows, cols // WORD), bits)
+        return result
+
+    def to_sparse(self, block_rows: int = 4096) -> csr_matrix:
+        """Unpack into boolean CSR, `block_rows` rows at a time"""
+        blocks = []
+        for begin in range(0, self.shape[0], block_rows):
+            words = self.words[begin : begin + block_rows]
+            bits = np.unpackbits(
+                words.astype("<u8").view(np.uint8), axis=1, bitorder="little"
+            )
+            blocks.append(csr_matrix(bits[:, : self.n_cols].astype(np.bool_)))
+        if not blocks:
+            return csr_matrix(self.shape, dtype=np.bool_)
+        return vstack(blocks, format="csr")
+
+    def count(self) -> int:
+        """Number of true cells"""
+        return _popcount(self.words)
+
+    def copy(self) -> "BitMatrix":
+        return BitMatrix(self.words.copy(), self.n_cols)
+
+    def __or__(self, other: "BitMatrix") -> "BitMatrix":
+        return BitMatrix(self.words | other.words, self.n_cols)
+
+    def __and__(self, other: "BitMatrix") -> "BitMatrix":
+        return BitMatrix(self.words & other.words, self.n_cols)
+
+    def andnot(self, other: "BitMatrix") -> "BitMatrix":
+        """Cells set here and not set in `other`"""
+        return BitMatrix(self.words & ~other.words, self.n_cols)
+
+    def __matmul__(self, other: "BitMatrix") -> "BitMatrix":
+        return self.multiply_blocked(other)
+
+    def multiply_rows(self, other: "BitMatrix") -> "BitMatrix":
+        """
+        OR-AND product: row `i` of the result is OR of the rows of `other`
+        selected by the bits of row `i`
+        """
+        result = BitMatrix.zeros(self.shape[0], other.n_cols)
+        bits = self.to_sparse()
+        for i in range(self.shape[0]):
+            selected = bits.indices[bits.indptr[i] : bits.indptr[i + 1]]
+            if len(selected):
+                result.words[i] = np.bitwise_or.reduce(other.words[selected], axis=0)
+        return result
+
+    def multiply_blocked(self, other: "BitMatrix") -> "BitMatrix":
+        """
+        Four Russians OR-AND product: columns of `self` are split into
+        bytes, for every byte a table of all 256 OR-combinations of the
+        corresponding 8 rows of `other` is built, and each row of `self`
+        picks its combination with one lookup per byte
+        """
+        n_rows, n_inner = self.shape[0], self.n_cols
+        result = BitMatrix.zeros(n_rows, other.n_cols)
+        if n_rows == 0 or n_inner == 0:
+            return result
+
+        n_groups = (n_inner + 7) // 8
+        right = np.zeros((n_groups * 8, other.words.shape[1]), dtype=np.uint64)
+        right[: other.shape[0]] = other.words
+        left = self.words.astype("<u8").view(np.uint8)[:, :n_groups]
+
+        combination = np.arange(256)
+        table = np.empty((256, right.shape[1]), dtype=np.uint64)
+        for g in range(n_groups):
+            column = left[:, g]
+            if not column.any():
+                continue
+            table.fill(0)
+            for bit in range(8):
+                table[(combination >> bit) & 1 == 1] |= right[g * 8 + bit]
+            result.words |= table[column]
+        return result
+
+
+def is_packed(matrix) -> bool:
+    return isinstance(matrix, BitMatrix)
+
+
+def density(matrix) -> float:
+    rows, cols = matrix.shape
+    return bool_nnz(matrix) / max(1, rows * cols)
+
+
+def choose_backend(matrix, threshold: float = PACKED_DENSITY):
+    """Packed matrix if at least `threshold` of the cells are set, CSR otherwise"""
+    if threshold is None:
+        return matrix
+    if density(matrix) >= threshold:
+        return matrix if is_packed(matrix) else BitMatrix.from_sparse(matrix)
+    return to_sparse(matrix)
+
+
+def to_sparse(matrix) -> csr_matrix:
+    return matrix.to_sparse() if is_packed(matrix) else csr_matrix(matrix)
+
+
+def _as_packed(matrix) -> BitMatrix:
+    return matrix if is_packed(matrix) else BitMatrix.from_sparse(matrix)
+
+
+def bool_nnz(matrix) -> int:
+    return matrix.count() if is_packed(matrix) else matrix.nnz
+
+
+def bool_matmul(a, b):
+    if issparse(a) and issparse(b):
+        return a @ b
+    return _as_packed(a) @ _as_packed(b)
+
+
+def bool_matmul_many(pairs: List[Tuple]) -> List:
+    """Products of all `(a, b)` pairs in this process"""
+    return [bool_matmul(a, b) for a, b in pairs]
+
+
+def bool_or(a, b):
+    if issparse(a) and issparse(b):
+        return a + b
+    return _as_packed(a) | _as_packed(b)
+
+
+def bool_andnot(a, b):
+    if issparse(a) and issparse(b):
+        return a > b
+    return _as_packed(a).andnot(_as_packed(b))
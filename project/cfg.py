@@ -1,4 +1,11 @@
-from pyformlang.cfg import CFG
+import time
+from collections import namedtuple
+from dataclasses import dataclass
+from typing import Dict, List, Set, Tuple
+
+from pyformlang.cfg import CFG, Production, Terminal, Variable
+
+from project.query_cache import QueryCache, default_cache, normalize_text
 
 
 def cfg_to_whnf(cfg: CFG) -> CFG:
@@ -13,6 +20,210 @@ def cfg_to_whnf(cfg: CFG) -> CFG:
     return CFG(start_symbol=cfg1.start_symbol, productions=new_rules)
 
 
+StageStats = namedtuple("StageStats", ["stage", "variables", "productions", "seconds"])
+
+
+def _count_variables(productions) -> int:
+    return len(
+        {head for head, _ in productions}
+        | {x for _, body in productions for x in body if x >= 0}
+    )
+
+
+def _encode(cfg: CFG) -> Tuple[int, List[Tuple], List, List]:
+    """
+    Number grammar symbols: variables are 0, 1, ..., terminal `t` is `-1 - t`
+    :param cfg: CFG
+    :return: start, productions as (head, body) tuples, variables, terminals
+    """
+    var_ids, term_ids = dict(), dict()
+
+    def var_id(var) -> int:
+        return var_ids.setdefault(var, len(var_ids))
+
+    def symbol_id(symbol) -> int:
+        if isinstance(symbol, Variable):
+            return var_id(symbol)
+        return -1 - term_ids.setdefault(symbol, len(term_ids))
+
+    start = var_id(cfg.start_symbol)
+    productions = [
+        (var_id(prod.head), tuple(symbol_id(x) for x in prod.body))
+        for prod in cfg.productions
+    ]
+    return start, productions, list(var_ids), list(term_ids)
+
+
+def _remove_useless(start: int, productions: List[Tuple]) -> List[Tuple]:
+    """
+    Keep productions over generating variables reachable from start.
+    Generating variables are found with a worklist and a counter of not yet
+    generating variables per production, so every production is visited
+    once per variable of its body.
+    """
+    pending = []
+    occurs = dict()
+    for k, (_, body) in enumerate(productions):
+        variables = {x for x in body if x >= 0}
+        pending.append(len(variables))
+        for x in variables:
+            occurs.setdefault(x, []).append(k)
+    generating = set()
+    queue = [productions[k][0] for k in range(len(productions)) if pending[k] == 0]
+    while queue:
+        var = queue.pop()
+        if var in generating:
+            continue
+        generating.add(var)
+        for k in occurs.get(var, ()):
+            pending[k] -= 1
+            if pending[k] == 0:
+                queue.append(productions[k][0])
+    if start not in generating:
+        return []
+
+    by_head = dict()
+    for k, (head, body) in enumerate(productions):
+        if pending[k] == 0:
+            by_head.setdefault(head, []).append(body)
+    reachable = {start}
+    queue = [start]
+    while queue:
+        for body in by_head.get(queue.pop(), ()):
+            for x in body:
+                if x >= 0 and x not in reachable:
+                    reachable.add(x)
+                    queue.append(x)
+    return [(head, body) for head in reachable for body in dict.fromkeys(by_head[head])]
+
+
+def _eliminate_units(productions: List[Tuple]) -> List[Tuple]:
+    """
+    Replace unit productions `A -> B` by the non-unit productions of every
+    variable reachable from `A` in the graph of unit productions
+    """
+    units, others = dict(), dict()
+    for head, body in productions:
+        if len(body) == 1 and body[0] >= 0:
+            units.setdefault(head, set()).add(body[0])
+        else:
+            others.setdefault(head, []).append(body)
+    result = dict()
+    for head in {head for head, _ in productions}:
+        reached = {head}
+        queue = [head]
+        while queue:
+            for var in units.get(queue.pop(), ()):
+                if var not in reached:
+                    reached.add(var)
+                    queue.append(var)
+        for var in reached:
+            for body in others.get(var, ()):
+                result[(head, body)] = None
+    return list(result)
+
+
+def _binarize(productions: List[Tuple], n_vars: int) -> Tuple[List[Tuple], Dict]:
+    """
+    Bring long bodies to two variables. Terminals inside long bodies are
+    replaced by one new variable per terminal and every suffix of a long
+    body gets one new variable shared by all bodies ending with it.
+    :return: productions and new variable -> terminal or suffix it stands for
+    """
+    new_vars = dict()
+    lifted = dict()
+    suffixes = dict()
+    result = []
+
+    def new_var(meaning) -> int:
+        var = n_vars + len(new_vars)
+        new_vars[var] = meaning
+        return var
+
+    def lift(x: int) -> int:
+        if x >= 0:
+            return x
+        if x not in lifted:
+            lifted[x] = new_var(x)
+            result.append((lifted[x], (x,)))
+        return lifted[x]
+
+    def suffix(body: Tuple) -> int:
+        if len(body) == 1:
+            return body[0]
+        if body not in suffixes:
+            var = suffixes[body] = new_var(body)
+            result.append((var, (body[0], suffix(body[1:]))))
+        return suffixes[body]
+
+    for head, body in productions:
+        if len(body) <= 1:
+            result.append((head, body))
+            continue
+        body = tuple(lift(x) for x in body)
+        result.append((head, (body[0], suffix(body[1:]))))
+    return result, new_vars
+
+
+def cfg_to_whnf_fast(cfg: CFG, stats: List[StageStats] = None) -> CFG:
+    """
+    Returns CFG in Weak Normal Chomsky Form equivalent to the original,
+    accepting the same language as :func:`cfg_to_whnf`. Works on integer
+    coded symbols and shares variables between equal suffixes of long bodies.
+    :param cfg: CFG
+    :param stats: if given, a :class:`StageStats` is appended for every stage
+    :return: CFG in Weak Normal Chomsky Form
+    """
+    began = time.perf_counter()
+
+    def record(stage: str, productions: List[Tuple]):
+        nonlocal began
+        if stats is not None:
+            seconds = time.perf_counter() - began
+            stats.append(
+                StageStats(
+                    stage, _count_variables(productions), len(productions), seconds
+                )
+            )
+            began = time.perf_counter()
+
+    start, productions, variables, terminals = _encode(cfg)
+    record("encode", productions)
+    productions = _remove_useless(start, productions)
+    record("useless", productions)
+    productions = _eliminate_units(productions)
+    record("units", productions)
+    productions = _remove_useless(start, productions)
+    record("useless", productions)
+    productions, new_vars = _binarize(productions, len(variables))
+    record("binarize", productions)
+
+    taken = {str(var.value) for var in variables}
+    names = list(variables)
+    for var, meaning in new_vars.items():
+        if isinstance(meaning, int):
+            name = f"{terminals[-1 - meaning].value}#CNF#"
+        else:
+            name = f"C#CNF#{var - len(variables)}"
+        while name in taken:
+            name += "#"
+        taken.add(name)
+        names.append(Variable(name))
+
+    def decode(x: int):
+        return names[x] if x >= 0 else terminals[-1 - x]
+
+    result = CFG(
+        start_symbol=cfg.start_symbol,
+        productions={
+            Production(names[head], [decode(x) for x in body])
+            for head, body in productions
+        },
+    )
+    record("decode", productions)
+    return result
+
+
 def cfg_from_file(path: str) -> CFG:
     """
     Returns CFG built from the text file
@@ -25,3 +236,51 @@ def cfg_from_file(path: str) -> CFG:
 
 def whnf_from_file(path: str) -> CFG:
     return cfg_to_whnf(cfg_from_file(path))
+
+
+def wcnf_production_index(cfg: CFG) -> Tuple[Dict, Dict]:
+    """
+    Group productions of CFG in Weak Normal Chomsky Form by body
+    :param cfg: CFG in Weak Normal Chomsky Form
+    :return: terminal value -> heads and (left, right) variable pair -> heads
+    """
+    terminal_heads = dict()
+    binary_heads = dict()
+    for prod in cfg.productions:
+        if len(prod.body) == 1:
+            terminal_heads.setdefault(prod.body[0].value, set()).add(prod.head)
+        elif len(prod.body) == 2:
+            binary_heads.setdefault((prod.body[0], prod.body[1]), set()).add(prod.head)
+    return terminal_heads, binary_heads
+
+
+@dataclass
+class CompiledGrammar:
+    """
+    CFG in Weak Normal Chomsky Form with its productions grouped by body
+    """
+
+    wcnf: CFG
+    terminal_heads: Dict[str, Set[Variable]]
+    binary_heads: Dict[Tuple[Variable, Variable], Set[Variable]]
+    epsilon_heads: Set[Variable]
+
+
+def compile_grammar(cfg: CFG, cache: QueryCache = None) -> CompiledGrammar:
+    """
+    Returns compiled WCNF of the grammar (built by :func:`cfg_to_whnf_fast`),
+    reusing it from the cache
+    :param cfg: CFG
+    :param cache: cache to use, the module default if omitted
+    :return: compiled grammar
+    """
+    lines = sorted(normalize_text(cfg.to_text()).splitlines())
+    key = "\n".join([f"cfg:{cfg.start_symbol}"] + lines)
+
+    def compile():
+        wcnf = cfg_to_whnf_fast(cfg)
+        terminal_heads, binary_heads = wcnf_production_index(wcnf)
+        epsilon_heads = {prod.head for prod in wcnf.productions if not prod.body}
+        return CompiledGrammar(wcnf, terminal_heads, binary_heads, epsilon_heads)
+
+    return (cache or default_cache).get(key, compile)
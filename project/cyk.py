@@ -0,0 +1,195 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from pyformlang.cfg import CFG, Variable
+
+from project.cfg import compile_grammar, wcnf_production_index
+
+_COMBINE_CACHE_SIZE = 1 << 16
+
+
+def _bits(mask: int) -> Iterable[int]:
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class CYKRecognizer:
+    """
+    CYK recognizer for a grammar in Weak Normal Chomsky Form.
+    Variables are numbered and every table cell is an integer bitset of
+    the variables deriving the substring. Productions are turned into
+    lookup tables once: terminal -> heads, left variable -> (right
+    variable, heads) pairs, and per variable the heads reachable through
+    binary productions whose other side is nullable (these act as unit
+    productions, so epsilon productions of any variable are supported).
+    """
+
+    def __init__(
+        self,
+        variables: List[Variable],
+        start: Variable,
+        terminal_heads: Dict,
+        binary_heads: Dict,
+        epsilon_heads: Iterable[Variable],
+    ):
+        self.variables = variables
+        var_idx = {var: i for i, var in enumerate(variables)}
+        self.start_mask = 1 << var_idx[start] if start in var_idx else 0
+
+        def mask(heads: Iterable[Variable]) -> int:
+            result = 0
+            for head in heads:
+                result |= 1 << var_idx[head]
+            return result
+
+        nullable = mask(epsilon_heads)
+        changed = True
+        while changed:
+            changed = False
+            for (left, right), heads in binary_heads.items():
+                if nullable >> var_idx[left] & nullable >> var_idx[right] & 1:
+                    extended = nullable | mask(heads)
+                    changed = changed or extended != nullable
+                    nullable = extended
+        self.accepts_empty = bool(nullable & self.start_mask)
+
+        units = [0] * len(variables)
+        self.by_left: Dict[int, List[Tuple[int, int]]] = dict()
+        for (left, right), heads in binary_heads.items():
+            i, j, heads_mask = var_idx[left], var_idx[right], mask(heads)
+            self.by_left.setdefault(i, []).append((j, heads_mask))
+            if nullable >> j & 1:
+                units[i] |= heads_mask
+            if nullable >> i & 1:
+                units[j] |= heads_mask
+        self.closure = self._close_units(units)
+        self.left_mask = mask(variables[i] for i in self.by_left)
+        self.terminal_masks = {
+            terminal: self.close(mask(heads))
+            for terminal, heads in terminal_heads.items()
+        }
+        self._combined: Dict[Tuple[int, int], int] = dict()
+
+    @staticmethod
+    def from_wcnf(wcnf: CFG) -> "CYKRecognizer":
+        """Build recognizer from the output of :func:`cfg_to_whnf`"""
+        terminal_heads, binary_heads = wcnf_production_index(wcnf)
+        epsilon_heads = {prod.head for prod in wcnf.productions if not prod.body}
+        return CYKRecognizer(
+            sorted(wcnf.variables, key=str),
+            wcnf.start_symbol,
+            terminal_heads,
+            binary_heads,
+            epsilon_heads,
+        )
+
+    @staticmethod
+    def from_cfg(cfg: CFG) -> "CYKRecognizer":
+        """Build recognizer from any CFG, reusing its cached compiled WCNF"""
+        grammar = compile_grammar(cfg)
+        return CYKRecognizer(
+            sorted(grammar.wcnf.variables, key=str),
+            grammar.wcnf.start_symbol,
+            grammar.terminal_heads,
+            grammar.binary_heads,
+            grammar.epsilon_heads,
+        )
+
+    @staticmethod
+    def _close_units(units: List[int]) -> List[int]:
+        """Per variable bitset of itself and all variables reachable by units"""
+        closure = [units[i] | 1 << i for i in range(len(units))]
+        changed = True
+        while changed:
+            changed = False
+            for i, reached in enumerate(closure):
+                extended = reached
+                for j in _bits(reached & ~(1 << i)):
+                    extended |= closure[j]
+                if extended != reached:
+                    closure[i] = extended
+                    changed = True
+        return closure
+
+    def close(self, cell: int) -> int:
+        result = cell
+        for i in _bits(cell):
+            result |= self.closure[i]
+        return result
+
+    def combine(self, left: int, right: int) -> int:
+        """Closed bitset of heads `A` for all `A -> B C`, `B` in left, `C` in right"""
+        key = (left, right)
+        result = self._combined.get(key)
+        if result is not None:
+            return result
+        result = 0
+        for i in _bits(left & self.left_mask):
+            for j, heads in self.by_left[i]:
+                if right >> j & 1:
+                    result |= heads
+        result = self.close(result)
+        if len(self._combined) >= _COMBINE_CACHE_SIZE:
+            self._combined.clear()
+        self._combined[key] = result
+        return result
+
+    def accepts(self, word: Sequence) -> bool:
+        """Check if the sequence of terminal values is derivable from start"""
+        n = len(word)
+        if n == 0:
+            return self.accepts_empty
+        # table[length - 1][i] -- variables deriving word[i : i + length]
+        table = [[self.terminal_masks.get(symbol, 0) for symbol in word]]
+        for length in range(2, n + 1):
+            row = []
+            for i in range(n - length + 1):
+                cell = 0
+                for split in range(1, length):
+                    left = table[split - 1][i]
+                    right = table[length - split - 1][i + split]
+                    if left and right:
+                        cell |= self.combine(left, right)
+                row.append(cell)
+            table.append(row)
+        return bool(table[n - 1][0] & self.start_mask)
+
+    def accepts_many(
+        self, words: Iterable[Sequence], workers: int = None
+    ) -> List[bool]:
+        """
+        Check every word; with `workers` > 1 the words are split between
+        processes that receive the compiled recognizer once
+        """
+        if workers is None or workers <= 1:
+            return [self.accepts(word) for word in words]
+        words = [list(word) for word in words]
+        chunk = max(1, len(words) // (workers * 4))
+        with ProcessPoolExecutor(
+            workers, initializer=_init_worker, initargs=(self,)
+        ) as executor:
+            return list(executor.map(_accepts, words, chunksize=chunk))
+
+
+_worker_recognizer = None
+
+
+def _init_worker(recognizer: CYKRecognizer):
+    global _worker_recognizer
+    _worker_recognizer = recognizer
+
+
+def _accepts(word: Sequence) -> bool:
+    return _worker_recognizer.accepts(word)
+
+
+def cyk(cfg: CFG, word: Sequence) -> bool:
+    """
+    Check if the word is derivable from the grammar with CYK
+    :param cfg: CFG
+    :param word: sequence of terminal values, a string is split into characters
+    :return: whether the word belongs to the language of cfg
+    """
+    return CYKRecognizer.from_cfg(cfg).accepts(word)
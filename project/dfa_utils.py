@@ -1,13 +1,43 @@
-from typing import Tuple, Dict, Iterable, Any, Set
-from pyformlang.finite_automaton import State
+import time
+from collections import namedtuple
+from dataclasses import dataclass
+from typing import Tuple, Dict, Iterable, Iterator, Any, Set, List, Sequence
+from pyformlang.finite_automaton import State, Symbol
 from pyformlang.regular_expression import Regex
 from pyformlang.finite_automaton import DeterministicFiniteAutomaton
 from pyformlang.finite_automaton import NondeterministicFiniteAutomaton
 from pyformlang.finite_automaton import EpsilonNFA
 import networkx as nx
-from scipy.sparse import dok_matrix, kron, eye, block_diag
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse import (
+    dok_matrix,
+    csr_matrix,
+    kron,
+    eye,
+    block_diag,
+    hstack,
+    vstack,
+)
 import numpy as np
 
+from project.bitmatrix import (
+    PACKED_DENSITY,
+    WORD,
+    BitMatrix,
+    bool_andnot,
+    bool_matmul_many,
+    bool_nnz,
+    bool_or,
+    choose_backend,
+    to_sparse,
+)
+from project.graph_index import GraphIndex, as_graph_index, csr_row_entries
+from project.parallel import MatrixPool
+from project.query_cache import QueryCache, default_cache
+from project.regex_compiler import MinimalDFA, compile_minimal_dfa
+
+IterationInfo = namedtuple("IterationInfo", ["iteration", "seconds", "nnz"])
+
 
 def regex2dfa(expr: str) -> DeterministicFiniteAutomaton:
     """Return minimized DFA from regular expression string
@@ -19,6 +49,28 @@ def regex2dfa(expr: str) -> DeterministicFiniteAutomaton:
     return dfa.minimize()
 
 
+def regex2dfa_native(expr: str) -> DeterministicFiniteAutomaton:
+    """Return minimized DFA from regular expression string, compiled by
+    :func:`compile_minimal_dfa` instead of pyformlang; states are `0..n-1`
+
+    Keyword arguments:
+    expr -- academic regular expression string;
+    """
+    return _dfa_from_minimal(compile_minimal_dfa(expr))
+
+
+def _dfa_from_minimal(minimal: MinimalDFA) -> DeterministicFiniteAutomaton:
+    dfa = DeterministicFiniteAutomaton()
+    dfa.add_start_state(State(minimal.start_state))
+    for state in minimal.final_states:
+        dfa.add_final_state(State(int(state)))
+    for fro, symb, to in zip(
+        minimal.sources.tolist(), minimal.symbol_ids.tolist(), minimal.targets.tolist()
+    ):
+        dfa.add_transition(State(fro), Symbol(minimal.symbols[symb]), State(to))
+    return dfa
+
+
 def graph2nfa(
     graph: nx.MultiDiGraph,
     starts: Iterable[Any] = None,
@@ -59,80 +111,539 @@ def nfa_to_bool_matrices(
     return state_to_inx, result, nfa.start_states, nfa.final_states
 
 
+@dataclass
+class BoolMatrixAutomaton:
+    """
+    Finite automaton stored as boolean CSR matrix per symbol,
+    states are numbered 0..n_states-1
+    """
+
+    n_states: int
+    matrices: Dict[Any, csr_matrix]
+    start_states: np.ndarray
+    final_states: np.ndarray
+
+    @staticmethod
+    def from_nfa(nfa: EpsilonNFA) -> "BoolMatrixAutomaton":
+        state_to_inx = {k: i for i, k in enumerate(nfa.states)}
+        n_states = len(state_to_inx)
+        coords = dict()
+        for v, s, u in nfa:
+            rows, cols = coords.setdefault(s, ([], []))
+            rows.append(state_to_inx[v])
+            cols.append(state_to_inx[u])
+        return BoolMatrixAutomaton(
+            n_states,
+            {s: _bool_csr(rows, cols, n_states) for s, (rows, cols) in coords.items()},
+            np.array([state_to_inx[s] for s in nfa.start_states], dtype=int),
+            np.array([state_to_inx[s] for s in nfa.final_states], dtype=int),
+        )
+
+    @staticmethod
+    def from_graph(
+        graph: nx.MultiDiGraph | GraphIndex,
+        starts: Iterable[Any],
+        finals: Iterable[Any],
+    ) -> "BoolMatrixAutomaton":
+        """Build automaton straight from graph adjacency, state `i` is node `i` of the graph index,
+        starts and finals missing from the graph are skipped"""
+        index = as_graph_index(graph)
+        node_idx = index.node_idx
+        return BoolMatrixAutomaton(
+            index.n_nodes,
+            dict(index.adjacency),
+            np.array([node_idx[s] for s in starts if s in node_idx], dtype=int),
+            np.array([node_idx[s] for s in finals if s in node_idx], dtype=int),
+        )
+
+    def adjacency(self) -> csr_matrix:
+        """Union of all symbol matrices"""
+        result = csr_matrix((self.n_states, self.n_states), dtype=np.bool_)
+        for matrix in self.matrices.values():
+            result = result + matrix
+        return result
+
+    def to_epsilon_nfa(self) -> EpsilonNFA:
+        result = EpsilonNFA()
+        for s, matrix in self.matrices.items():
+            from_idx, to_idx = matrix.nonzero()
+            result.add_transitions(
+                [(State(v), s, State(u)) for v, u in zip(from_idx, to_idx)]
+            )
+        for i in self.start_states:
+            result.add_start_state(State(i))
+        for i in self.final_states:
+            result.add_final_state(State(i))
+        return result
+
+
+def _bool_csr(rows, cols, n: int) -> csr_matrix:
+    return csr_matrix(
+        (np.ones(len(rows), dtype=np.bool_), (rows, cols)),
+        shape=(n, n),
+        dtype=np.bool_,
+    )
+
+
+def intersect_matrices(
+    a1: BoolMatrixAutomaton, a2: BoolMatrixAutomaton
+) -> BoolMatrixAutomaton:
+    """Intersection of two matrix automatons,
+    state `i * a2.n_states + j` is the pair of `i` from `a1` and `j` from `a2`"""
+    symbols = set(a1.matrices.keys()).intersection(a2.matrices.keys())
+    return BoolMatrixAutomaton(
+        a1.n_states * a2.n_states,
+        {s: kron(a1.matrices[s], a2.matrices[s], format="csr") for s in symbols},
+        (a1.start_states[:, None] * a2.n_states + a2.start_states).ravel(),
+        (a1.final_states[:, None] * a2.n_states + a2.final_states).ravel(),
+    )
+
+
 def nfa_intersect(nfa1: EpsilonNFA, nfa2: EpsilonNFA) -> EpsilonNFA:
     """Intersection of two finite automatons"""
-    nfa1_state_to_inx, nfa1_matrices, ss1, fs1 = nfa_to_bool_matrices(nfa1)
-    nfa2_state_to_inx, nfa2_matrices, ss2, fs2 = nfa_to_bool_matrices(nfa2)
-
-    result = EpsilonNFA()
-    symbols = set.intersection(set(nfa1_matrices.keys()), set(nfa2_matrices.keys()))
-    result_matrices = {s: kron(nfa1_matrices[s], nfa1_matrices[s]) for s in symbols}
-
-    for s, matrix in result_matrices.items():
-        from_idx, to_idx = matrix.nonzero()
-        for v, u in zip(from_idx, to_idx):
-            result.add_transition(v, s, u)
-
-    for s1 in ss1:
-        for s2 in ss2:
-            state = State(
-                nfa1_state_to_inx[s1] * len(nfa2_state_to_inx) + nfa2_state_to_inx[s2]
+    return intersect_matrices(
+        BoolMatrixAutomaton.from_nfa(nfa1), BoolMatrixAutomaton.from_nfa(nfa2)
+    ).to_epsilon_nfa()
+
+
+def union_matrices(
+    automata: Sequence[BoolMatrixAutomaton],
+) -> Tuple[BoolMatrixAutomaton, np.ndarray]:
+    """Disjoint union of matrix automatons, states of `automata[k]` follow
+    the states of `automata[:k]`; also returns the number of the automaton
+    owning every state"""
+    sizes = np.array([a.n_states for a in automata], dtype=int)
+    offsets = np.cumsum(sizes) - sizes
+    symbols = set().union(*(a.matrices.keys() for a in automata))
+    matrices = {
+        s: block_diag(
+            [a.matrices.get(s, csr_matrix((a.n_states, a.n_states))) for a in automata],
+            format="csr",
+            dtype=np.bool_,
+        )
+        for s in symbols
+    }
+    return (
+        BoolMatrixAutomaton(
+            int(sizes.sum()),
+            matrices,
+            np.concatenate(
+                [a.start_states + k for a, k in zip(automata, offsets)] + [[]]
+            ).astype(int),
+            np.concatenate(
+                [a.final_states + k for a, k in zip(automata, offsets)] + [[]]
+            ).astype(int),
+        ),
+        np.repeat(np.arange(len(automata)), sizes),
+    )
+
+
+@dataclass
+class CompiledRegex:
+    """
+    Minimized DFA of regular expression with its state numbering,
+    `automaton` uses the same numbering as `state_idx`
+    """
+
+    dfa: DeterministicFiniteAutomaton
+    state_idx: Dict[State, int]
+    matrices: Dict[Any, dok_matrix]
+    automaton: BoolMatrixAutomaton
+
+
+def compile_regex(expr: str, cache: QueryCache = None) -> CompiledRegex:
+    """Return compiled regular expression, reusing it from the cache
+
+    Keyword arguments:
+    expr -- academic regular expression string;
+    cache -- cache to use, the module default if omitted;
+    """
+
+    def compile():
+        minimal = compile_minimal_dfa(expr)
+        dfa = _dfa_from_minimal(minimal)
+        matrices = minimal.to_matrices()
+        automaton = BoolMatrixAutomaton(
+            minimal.n_states,
+            matrices,
+            np.array([minimal.start_state], dtype=int),
+            minimal.final_states.astype(int),
+        )
+        return CompiledRegex(
+            dfa,
+            {State(i): i for i in range(minimal.n_states)},
+            {s: m.todok() for s, m in matrices.items()},
+            automaton,
+        )
+
+    return (cache or default_cache).get("regex:" + " ".join(expr.split()), compile)
+
+
+def transitive_closure(
+    matrix,
+    delta: bool = False,
+    stats: List[IterationInfo] = None,
+    closed: csr_matrix = None,
+    packed_density: float = PACKED_DENSITY,
+    pool: MatrixPool = None,
+) -> csr_matrix:
+    """Return transitive closure of boolean adjacency matrix
+
+    Keyword arguments:
+    matrix -- square boolean sparse matrix;
+    delta -- multiply only the entries added in the previous round
+    against the closure instead of squaring the whole matrix;
+    stats -- optional list receiving :class:`IterationInfo` per round;
+    closed -- already transitively closed matrix to extend with `matrix`,
+    implies `delta`;
+    packed_density -- switch the closure to :class:`BitMatrix` once this
+    share of cells is set, None to stay sparse;
+    pool -- :class:`MatrixPool` to run the products on, serial if omitted;
+    """
+    matmul_many = pool.matmul_many if pool is not None else bool_matmul_many
+    closure = csr_matrix(matrix, dtype=np.bool_)
+    front = closure
+    if closed is not None:
+        delta = True
+        front = closure > closed
+        closure = closed + front
+    iteration = 0
+    changed = True
+    while changed:
+        began = time.perf_counter()
+        closure = choose_backend(closure, packed_density)
+        if delta:
+            left, right = matmul_many([(front, closure), (closure, front)])
+            front = bool_andnot(bool_or(left, right), closure)
+            closure = bool_or(closure, front)
+            changed = bool_nnz(front) != 0
+        else:
+            prev = bool_nnz(closure)
+            (square,) = matmul_many([(closure, closure)])
+            closure = bool_or(closure, square)
+            changed = bool_nnz(closure) != prev
+        iteration += 1
+        if stats is not None:
+            stats.append(
+                IterationInfo(iteration, time.perf_counter() - began, bool_nnz(closure))
             )
-            result.add_start_state(state)
+    return to_sparse(closure)
+
+
+def scc_closure(
+    matrix, rows: np.ndarray = None, columns: np.ndarray = None
+) -> csr_matrix:
+    """Return `rows` x `columns` block of the transitive closure, computed
+    over the condensation of the matrix into strongly connected components
 
-    for f1 in fs1:
-        for f2 in fs2:
-            state = State(
-                nfa1_state_to_inx[f1] * len(nfa2_state_to_inx) + nfa2_state_to_inx[f2]
+    Components are processed in topological order from the sinks, one level
+    of the DAG at a time. Every component keeps a :class:`BitMatrix` row of
+    the target components (those holding `columns`) reachable from it by a
+    path of at least one edge; the rows of its successors are OR-ed into it.
+    Cycles are never iterated, so graphs with large strongly connected
+    components need no squaring rounds.
+
+    Keyword arguments:
+    matrix -- square boolean sparse matrix;
+    rows -- row numbers of the block, all rows if omitted;
+    columns -- column numbers of the block, all columns if omitted;
+    """
+    matrix = csr_matrix(matrix, dtype=np.bool_)
+    n = matrix.shape[0]
+    rows = np.arange(n) if rows is None else np.asarray(rows, dtype=int)
+    columns = np.arange(n) if columns is None else np.asarray(columns, dtype=int)
+    n_comp, labels = connected_components(matrix, directed=True, connection="strong")
+
+    src, dst = matrix.nonzero()
+    src, dst = labels[src], labels[dst]
+    inner = src == dst
+    cyclic = np.bincount(labels, minlength=n_comp) > 1
+    cyclic[src[inner]] = True
+    dag = _bool_csr(src[~inner], dst[~inner], n_comp)
+    dag.sum_duplicates()
+
+    targets, target_of = np.unique(labels[columns], return_inverse=True)
+    position = np.full(n_comp, -1, dtype=int)
+    position[targets] = np.arange(len(targets))
+    reach = BitMatrix.zeros(n_comp, len(targets))
+
+    def reached_through(comps: np.ndarray) -> np.ndarray:
+        """Rows of `comps` with their own bits set"""
+        words = reach.words[comps]
+        bit = position[comps]
+        hit = np.flatnonzero(bit >= 0)
+        words[hit, bit[hit] // WORD] |= np.left_shift(
+            np.uint64(1), (bit[hit] % WORD).astype(np.uint64)
+        )
+        return words
+
+    looped = np.flatnonzero(cyclic)
+    reach.words[looped] = reached_through(looped)
+
+    out_degree = np.diff(dag.indptr)
+    predecessors = dag.transpose().tocsr()
+    level = np.flatnonzero(out_degree == 0)
+    while len(level):
+        # successors of the level are done, fold their rows in
+        owner, successors = csr_row_entries(dag, level)
+        if len(successors):
+            firsts = np.flatnonzero(np.r_[True, owner[1:] != owner[:-1]])
+            reach.words[level[owner[firsts]]] |= np.bitwise_or.reduceat(
+                reached_through(successors), firsts, axis=0
             )
-            result.add_final_state(state)
+        _, entered = csr_row_entries(predecessors, level)
+        out_degree -= np.bincount(entered, minlength=n_comp)
+        entered = np.unique(entered)
+        level = entered[out_degree[entered] == 0]
 
-    return result
+    block = BitMatrix(reach.words[labels[rows]], len(targets)).to_sparse()
+    return block[:, target_of].tocsr()
+
+
+@dataclass
+class PairAnswers:
+    """
+    Query answers in columnar form: pair `i` connects node number
+    `sources[i]` to node number `targets[i]`, numbers index `nodes`
+    """
+
+    sources: np.ndarray
+    targets: np.ndarray
+    nodes: Sequence
+
+    @staticmethod
+    def from_indices(sources, targets, nodes: Sequence) -> "PairAnswers":
+        """Answers from node numbers, duplicates are dropped and pairs sorted"""
+        n = len(nodes)
+        matrix = csr_matrix(
+            (np.ones(len(sources), dtype=np.bool_), (sources, targets)),
+            shape=(n, n),
+            dtype=np.bool_,
+        )
+        return PairAnswers(*PairAnswers._coords(matrix), nodes)
+
+    @staticmethod
+    def _coords(matrix: csr_matrix) -> Tuple[np.ndarray, np.ndarray]:
+        matrix.sum_duplicates()
+        rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+        return rows, matrix.indices.astype(rows.dtype)
+
+    def __len__(self) -> int:
+        return len(self.sources)
+
+    def to_matrix(self) -> csr_matrix:
+        """Answers as boolean `n x n` adjacency matrix"""
+        n = len(self.nodes)
+        return csr_matrix(
+            (np.ones(len(self), dtype=np.bool_), (self.sources, self.targets)),
+            shape=(n, n),
+            dtype=np.bool_,
+        )
+
+    def names(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Node names of sources and targets, as arrays"""
+        nodes = self.nodes
+        if not isinstance(nodes, np.ndarray):
+            nodes = np.empty(len(self.nodes), dtype=object)
+            nodes[:] = self.nodes
+        return nodes[self.sources], nodes[self.targets]
+
+    def to_set(self) -> Set[Tuple]:
+        return set(zip(*(column.tolist() for column in self.names())))
 
 
 def query(
     regex: str,
-    graph: nx.MultiDiGraph,
+    graph: nx.MultiDiGraph | GraphIndex,
     start_states,
     final_states,
-) -> Set[Tuple[State, State]]:
+    delta: bool = False,
+    stats: List[IterationInfo] = None,
+    workers: int = None,
+    columnar: bool = False,
+    closure: str = "squaring",
+) -> Set[Tuple] | PairAnswers:
     """Finds all pairs of start and end states such that the end state is reachable from the start state
-    with the restrictions specified in the regular expression."""
-    g1 = regex2dfa(regex)
-    g2 = graph2nfa(graph, start_states, final_states)
-    result_i = nfa_intersect(g1, g2)
+    with the restrictions specified in the regular expression.
+
+    `delta` and `stats` are passed to :func:`transitive_closure`,
+    `workers` > 1 runs the closure products on a :class:`MatrixPool`.
+    With `closure="scc"` only the start x final block of the closure is
+    computed by :func:`scc_closure`, the other closure options are unused.
+    With `columnar` the answers are returned as :class:`PairAnswers`.
+    Shortest paths witnessing the answers are given by
+    :class:`project.provenance.RPQProvenance`."""
+    index = as_graph_index(graph)
+    g1 = compile_regex(regex).automaton
+    g2 = BoolMatrixAutomaton.from_graph(index, start_states, final_states)
+    product = intersect_matrices(g1, g2)
+    starts = np.sort(product.start_states)
+    finals = np.sort(product.final_states)
+
+    if closure == "scc":
+        selected = scc_closure(product.adjacency(), starts, finals)
+    elif closure == "squaring":
+        if workers is not None and workers > 1:
+            with MatrixPool(workers) as pool:
+                c_matrix = transitive_closure(
+                    product.adjacency(), delta, stats, pool=pool
+                )
+        else:
+            c_matrix = transitive_closure(product.adjacency(), delta, stats)
+        selected = c_matrix[starts][:, finals].tocsr()
+    else:
+        raise ValueError(f"unknown closure {closure!r}")
+    rows, cols = PairAnswers._coords(selected)
+    answers = PairAnswers.from_indices(
+        starts[rows] % g2.n_states, finals[cols] % g2.n_states, index.nodes
+    )
+    return answers if columnar else answers.to_set()
+
+
+def coreachable_states(automaton: BoolMatrixAutomaton) -> np.ndarray:
+    """Return mask of states from which a final state is reachable
 
-    state_to_inx, matrices, start_states_r, final_states_r = nfa_to_bool_matrices(
-        result_i
+    Keyword arguments:
+    automaton -- matrix automaton;
+    """
+    adjacency = automaton.adjacency()
+    mask = np.zeros(automaton.n_states, dtype=np.bool_)
+    mask[automaton.final_states] = True
+    front = mask.copy()
+    while front.any():
+        front = (adjacency @ front.astype(np.int64) != 0) & ~mask
+        mask |= front
+    return mask
+
+
+def query_iter(
+    regex: str,
+    graph: nx.MultiDiGraph | GraphIndex,
+    start_states,
+    final_states,
+    limit: int = None,
+    target: Tuple = None,
+) -> Iterator[Tuple]:
+    """Yield pairs of :func:`query` as soon as they are found
+
+    The product automaton is first pruned to states that can reach a final
+    state, then every start node is searched level by level and new pairs
+    are yielded after each level.
+
+    Keyword arguments:
+    limit -- stop after this many pairs;
+    target -- `(start, final)` pair: search only from its start and stop
+    as soon as it is found;
+    """
+    if limit is not None and limit <= 0:
+        return
+    if target is not None:
+        start_states, final_states = [target[0]], [target[1]]
+
+    index = as_graph_index(graph)
+    g1 = compile_regex(regex).automaton
+    g2 = BoolMatrixAutomaton.from_graph(index, start_states, final_states)
+    product = intersect_matrices(g1, g2)
+
+    useful = coreachable_states(product)
+    if not useful[product.start_states].any():
+        return
+    forward = product.adjacency().transpose().tocsr()
+    is_final = np.zeros(product.n_states, dtype=np.bool_)
+    is_final[product.final_states] = True
+
+    n_graph = g2.n_states
+    count = 0
+    for u in dict.fromkeys(start_states):
+        if u not in index.node_idx:
+            continue
+        u_idx = index.node_idx[u]
+        front = np.zeros(product.n_states, dtype=np.bool_)
+        front[g1.start_states * n_graph + u_idx] = True
+        front &= useful
+        visited = np.zeros(product.n_states, dtype=np.bool_)
+        found = set()
+        while front.any():
+            front = (forward @ front.astype(np.int64) != 0) & useful & ~visited
+            visited |= front
+            for v_idx in np.flatnonzero(front & is_final) % n_graph:
+                if v_idx in found:
+                    continue
+                found.add(v_idx)
+                yield u, index.nodes[v_idx]
+                count += 1
+                if target is not None or (limit is not None and count >= limit):
+                    return
+
+
+def BFSBasedRPQ_fronts(
+    regex_dfa: DeterministicFiniteAutomaton,
+    regex_idx: Dict[Any, int],
+    n_graph: int,
+    transitions: Dict,
+    start_groups: List[Iterable[int]],
+) -> csr_matrix:
+    """
+    Run one BFS for every group of starting nodes at once.
+
+    Fronts of all groups are stacked into one matrix of shape
+    (len(start_groups) * n_regex) x (n_regex + n_graph): block `b` holds
+    group `b`, the row inside the block is a DFA state. Each step is one
+    sparse product per symbol followed by a row permutation that moves
+    every row to the DFA state it has reached.
+    Returns visited (DFA state, node) pairs in the same stacked layout,
+    without the DFA columns.
+    """
+    return _stacked_bfs(
+        len(regex_dfa.states),
+        [regex_idx[rs] for rs in regex_dfa.start_states],
+        n_graph,
+        transitions,
+        start_groups,
     )
 
-    c_matrix = dok_matrix((len(state_to_inx), len(state_to_inx)), dtype=np.bool_)
-    for matrix in matrices.values():
-        c_matrix |= matrix
-
-    flag = False
-    while not flag:
-        p1 = c_matrix.count_nonzero()
-        c_matrix += c_matrix @ c_matrix
-        flag = p1 == c_matrix.count_nonzero()
-
-    result = set()
-    mapping = {i: k for k, i in state_to_inx.items()}
-    states_list = list(g2.states)
-    n_states = len(g2.states)
-
-    from_idx, to_idx = c_matrix.nonzero()
-    for fro, to in zip(from_idx, to_idx):
-        fro_id, to_id = mapping[fro], mapping[to]
-        if fro_id in start_states_r and to_id in final_states_r:
-            result.add(
-                (
-                    states_list[fro_id.value % n_states],
-                    states_list[to_id.value % n_states],
-                )
-            )
 
-    return result
+def _stacked_bfs(
+    n_regex: int,
+    start_rows: Iterable[int],
+    n_graph: int,
+    transitions: Dict,
+    start_groups: List[Iterable[int]],
+) -> csr_matrix:
+    """:func:`BFSBasedRPQ_fronts` over numbered automaton states"""
+    n_blocks = len(start_groups)
+    n_rows = n_blocks * n_regex
+    states = vstack([eye(n_regex, dtype=np.bool_)] * n_blocks, format="csr")
+    block_base = np.arange(n_rows) - np.arange(n_rows) % n_regex
+
+    rows, cols = [], []
+    for i in start_rows:
+        for b, group in enumerate(start_groups):
+            for s in group:
+                rows.append(b * n_regex + i)
+                cols.append(s)
+    visited = csr_matrix(
+        (np.ones(len(rows), dtype=np.bool_), (rows, cols)),
+        shape=(n_rows, n_graph),
+        dtype=np.bool_,
+    )
+
+    front = visited
+    while front.nnz != 0:
+        stacked = hstack([states, front], format="csr")
+        new_front = csr_matrix((n_rows, n_graph), dtype=np.bool_)
+        for matrix in transitions.values():
+            next = stacked @ matrix
+            src, dst = next[:, :n_regex].nonzero()
+            permutation = csr_matrix(
+                (np.ones(len(src), dtype=np.bool_), (block_base[src] + dst, src)),
+                shape=(n_rows, n_rows),
+                dtype=np.bool_,
+            )
+            new_front = new_front + permutation @ next[:, n_regex:]
+        front = new_front > visited
+        visited = visited + front
+    return visited
 
 
 def BFSBasedRPQ_util(
@@ -146,85 +657,261 @@ def BFSBasedRPQ_util(
     """
     Find nodes in graph, accessible from at least one of the selected starting nodes.
     """
-    n_regex = len(regex_dfa.states)
-    m_graph = n_regex + n_graph
+    visited = BFSBasedRPQ_fronts(
+        regex_dfa, regex_idx, n_graph, transitions, [list(starts)]
+    )
+    final_rows = [regex_idx[fs] for fs in regex_dfa.final_states]
+    _, nodes = visited[final_rows].nonzero()
+    return {node_names[i] for i in nodes}
 
-    M = eye(n_regex, m_graph, dtype=np.bool_, format="dok")
 
-    for rs in regex_dfa.start_states:
-        i = regex_idx[rs]
-        for s in starts:
-            M[i, n_regex + s] = True
+def _bfs_reached(
+    regex: str, index: GraphIndex, start_groups: List[List[int]]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Run batched BFS for groups of starting node numbers, return
+    (group, node number) arrays of nodes reached in a final DFA state
+    """
+    compiled = compile_regex(regex)
+    regex_dfa = compiled.dfa
+    regex_idx, regex_mat = compiled.state_idx, compiled.matrices
+    graph_mat = index.adjacency
 
-    prev = 0
-    front = M
-    while M.count_nonzero() != prev:
-        prev = M.count_nonzero()
-        new_front = eye(n_regex, m_graph, dtype=np.bool_, format="dok")
-        for matrix in transitions.values():
-            next = front @ matrix
-            for i in range(n_regex):
-                for j in range(n_regex):
-                    if next[i, j]:
-                        new_front[j, n_regex:] += next[i, n_regex:]
-        M += new_front
-        front = new_front
-
-    result = set()
-    for fs in regex_dfa.final_states:
-        fs_id = regex_idx[fs]
-        for i in range(n_graph):
-            if M[fs_id, n_regex + i]:
-                result.add(node_names[i])
-    return result
+    common_symbols = set(regex_mat.keys()).intersection(graph_mat.keys())
+    transitions = {
+        s: block_diag((regex_mat[s], graph_mat[s]), format="csr")
+        for s in common_symbols
+    }
+    visited = BFSBasedRPQ_fronts(
+        regex_dfa, regex_idx, index.n_nodes, transitions, start_groups
+    )
+    finals = np.array([regex_idx[fs] for fs in regex_dfa.final_states], dtype=int)
+    if len(finals) == 0:
+        empty = np.zeros(0, dtype=int)
+        return empty, empty
+    n_regex = len(regex_dfa.states)
+    blocks, nodes = visited[
+        (np.arange(len(start_groups))[:, None] * n_regex + finals).ravel()
+    ].nonzero()
+    return blocks // len(finals), nodes
 
 
 def BFSBasedRPQ_type(
-    regex: str, graph: nx.MultiDiGraph, starts: Iterable, type=True
+    regex: str, graph: nx.MultiDiGraph | GraphIndex, starts: Iterable, type=True
 ) -> Set | Dict:
     """
     Find nodes in graph, accessible from nodes depending on the type.
+    With `type=False` all starting nodes are searched in one batched BFS.
     Returns
     -------
     Set or Dict of accessible nodes
     """
-    regex_dfa = regex2dfa(regex)
-    regex_idx, regex_mat, _, _ = nfa_to_bool_matrices(regex_dfa)
-    graph_idx, graph_mat, _, _ = nfa_to_bool_matrices(graph2nfa(graph, starts, starts))
+    index = as_graph_index(graph)
+    starts, groups = _start_groups(index, starts, type)
+    blocks, nodes = _bfs_reached(regex, index, groups)
+    return _bfs_answers(index, starts, groups, blocks, nodes, type, False)
 
-    common_symbols = set(regex_mat.keys()).intersection(graph_mat.keys())
-    transitions = {
-        s: block_diag((regex_mat[s], graph_mat[s]), format="dok")
-        for s in common_symbols
-    }
-    graph_names = {v: k for k, v in graph_idx.items()}
 
-    if type:
-        start_idx = [graph_idx[s] for s in starts]
-        return BFSBasedRPQ_util(
-            regex_dfa, regex_idx, len(graph_idx), graph_names, transitions, start_idx
+def _bidirectional_steps(compiled: CompiledRegex, index: GraphIndex) -> Tuple:
+    """
+    Per symbol factors of one product step: a front of (DFA state, node)
+    pairs `F` moves forward to `D^T F A` and backward to `D F A^T`
+    """
+    forward, backward = [], []
+    for symb in set(compiled.matrices.keys()).intersection(index.adjacency.keys()):
+        dfa_step = csr_matrix(compiled.matrices[symb], dtype=np.bool_)
+        forward.append((dfa_step.transpose().tocsr(), index.adjacency[symb]))
+        backward.append((dfa_step, index.transposed[symb]))
+    return forward, backward
+
+
+def _expand(front: csr_matrix, steps: List[Tuple]) -> csr_matrix:
+    result = csr_matrix(front.shape, dtype=np.bool_)
+    for dfa_step, graph_step in steps:
+        result = result + dfa_step @ front @ graph_step
+    return result
+
+
+def BFSBasedRPQ_bidirectional(
+    forward: List[Tuple], backward: List[Tuple], source: csr_matrix, target: csr_matrix
+) -> bool:
+    """
+    Check if some pair of `target` is reachable from some pair of `source`.
+
+    Keyword arguments:
+    forward, backward -- product steps from :func:`_bidirectional_steps`;
+    source -- (DFA state x node) matrix of starting pairs;
+    target -- (DFA state x node) matrix of final pairs;
+
+    The forward front grows from `source`, the backward front from
+    `target` over the reversed DFA and graph. The smaller front is expanded
+    first and the search stops as soon as the two visited sets meet.
+    """
+    steps = [forward, backward]
+    fronts = [source, target]
+    visited = [source, target]
+    if source.multiply(target).nnz != 0:
+        return True
+    while fronts[0].nnz != 0 and fronts[1].nnz != 0:
+        side = 0 if fronts[0].nnz <= fronts[1].nnz else 1
+        front = _expand(fronts[side], steps[side]) > visited[side]
+        if front.multiply(visited[1 - side]).nnz != 0:
+            return True
+        visited[side] = visited[side] + front
+        fronts[side] = front
+    return False
+
+
+def query_bidirectional(
+    regex: str,
+    graph: nx.MultiDiGraph | GraphIndex,
+    starts: Iterable,
+    finals: Iterable,
+    type=True,
+) -> Set | Dict:
+    """
+    Same answers as :func:`query_bfs`, found by one bidirectional search
+    per final node (and per starting node with `type=False`).
+    Meant for single pairs and small sets of nodes.
+    """
+    compiled = compile_regex(regex)
+    index = as_graph_index(graph)
+    forward, backward = _bidirectional_steps(compiled, index)
+    dfa, state_idx = compiled.dfa, compiled.state_idx
+    shape = (len(state_idx), index.n_nodes)
+    start_rows = [state_idx[s] for s in dfa.start_states]
+    final_rows = [state_idx[s] for s in dfa.final_states]
+
+    def pairs(rows: List[int], nodes: Iterable) -> csr_matrix:
+        cols = [index.node_idx[v] for v in nodes if v in index.node_idx]
+        return csr_matrix(
+            (
+                np.ones(len(rows) * len(cols), dtype=np.bool_),
+                (np.repeat(rows, len(cols)), np.tile(cols, len(rows))),
+            ),
+            shape=shape,
+            dtype=np.bool_,
         )
-    else:
-        result = dict()
-        for s in starts:
-            result[s] = BFSBasedRPQ_util(
-                regex_dfa,
-                regex_idx,
-                len(graph_idx),
-                graph_names,
-                transitions,
-                [graph_idx[s]],
+
+    def reachable(sources: Iterable) -> Set:
+        source = pairs(start_rows, sources)
+        return {
+            v
+            for v in dict.fromkeys(finals)
+            if BFSBasedRPQ_bidirectional(
+                forward, backward, source, pairs(final_rows, [v])
             )
-        return result
+        }
+
+    if type:
+        return reachable(starts)
+    return {u: reachable([u]) for u in dict.fromkeys(starts)}
 
 
 def query_bfs(
-    regex: str, graph: nx.MultiDiGraph, starts: Iterable, finals: Iterable, type=True
-) -> Set | Dict:
+    regex: str,
+    graph: nx.MultiDiGraph | GraphIndex,
+    starts: Iterable,
+    finals: Iterable,
+    type=True,
+    columnar: bool = False,
+) -> Set | Dict | np.ndarray | PairAnswers:
+    """
+    With `columnar` the answers are node numbers: a sorted array of
+    reached nodes for `type=True`, :class:`PairAnswers` for `type=False`
+    """
+    index = as_graph_index(graph)
+    starts, groups = _start_groups(index, starts, type)
+    blocks, nodes = _bfs_reached(regex, index, groups)
+    keep = _final_mask(index, finals)[nodes]
+    return _bfs_answers(
+        index, starts, groups, blocks[keep], nodes[keep], type, columnar
+    )
+
+
+def _start_groups(index: GraphIndex, starts: Iterable, type: bool) -> Tuple:
+    """Starting nodes and the groups of their numbers searched together,
+    nodes missing from the graph are left out of the groups"""
+    graph_idx = index.node_idx
     if type:
-        return BFSBasedRPQ_type(regex, graph, starts, type).intersection(set(finals))
-    else:
-        return {
-            k: v.intersection(set(finals))
-            for k, v in BFSBasedRPQ_type(regex, graph, starts, type).items()
-        }
+        return starts, [[graph_idx[s] for s in starts if s in graph_idx]]
+    starts = list(dict.fromkeys(starts))
+    return starts, [[graph_idx[s]] if s in graph_idx else [] for s in starts]
+
+
+def _final_mask(index: GraphIndex, finals: Iterable) -> np.ndarray:
+    mask = np.zeros(index.n_nodes, dtype=np.bool_)
+    mask[[index.node_idx[v] for v in finals if v in index.node_idx]] = True
+    return mask
+
+
+def _bfs_answers(
+    index: GraphIndex,
+    starts: List,
+    groups: List[List[int]],
+    blocks: np.ndarray,
+    nodes: np.ndarray,
+    type: bool,
+    columnar: bool,
+) -> Set | Dict | np.ndarray | PairAnswers:
+    """Answers of :func:`query_bfs` from (group, node number) arrays"""
+    if type:
+        nodes = np.unique(nodes)
+        return nodes if columnar else {index.nodes[i] for i in nodes.tolist()}
+    if columnar:
+        first = [group[0] if group else -1 for group in groups]
+        sources = np.array(first, dtype=int)[blocks]
+        return PairAnswers.from_indices(sources, nodes, index.nodes)
+    result = {s: set() for s in starts}
+    for b, i in zip(blocks.tolist(), nodes.tolist()):
+        result[starts[b]].add(index.nodes[i])
+    return result
+
+
+def query_many(
+    regexes: Sequence[str],
+    graph: nx.MultiDiGraph | GraphIndex,
+    starts: Iterable,
+    finals: Iterable,
+    type=True,
+    columnar: bool = False,
+) -> List:
+    """
+    Answers of :func:`query_bfs` for every regex of `regexes`, in order.
+    All regexes are searched by one batched BFS over the shared graph
+    matrices: the automaton is the disjoint union of their minimized DFAs
+    and every reached final state is tagged with the number of its regex.
+    """
+    if not regexes:
+        return []
+    index = as_graph_index(graph)
+    union, owner = union_matrices([compile_regex(r).automaton for r in regexes])
+    transitions = {
+        s: block_diag((union.matrices[s], index.adjacency[s]), format="csr")
+        for s in set(union.matrices.keys()).intersection(index.adjacency.keys())
+    }
+    starts, groups = _start_groups(index, starts, type)
+    final_states = union.final_states
+    visited = _stacked_bfs(
+        union.n_states, union.start_states, index.n_nodes, transitions, groups
+    )
+    rows, nodes = visited[
+        (np.arange(len(groups))[:, None] * union.n_states + final_states).ravel()
+    ].nonzero()
+    keep = _final_mask(index, finals)[nodes]
+    rows, nodes = rows[keep], nodes[keep]
+    n_finals = max(1, len(final_states))
+    blocks = rows // n_finals
+    queries = owner[final_states][rows % n_finals]
+    return [
+        _bfs_answers(
+            index,
+            starts,
+            groups,
+            blocks[queries == k],
+            nodes[queries == k],
+            type,
+            columnar,
+        )
+        for k in range(len(regexes))
+    ]
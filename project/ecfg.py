@@ -1,14 +1,69 @@
-from typing import AbstractSet, Dict
+from typing import AbstractSet, Dict, List, Sequence, Tuple
 
 from dataclasses import dataclass
-from scipy.sparse import dok_matrix
+from scipy.sparse import csr_matrix
 
 from pyformlang.cfg import CFG, Variable, Terminal
-from pyformlang.finite_automaton import DeterministicFiniteAutomaton
+from pyformlang.finite_automaton import DeterministicFiniteAutomaton, State, Symbol
 from pyformlang.regular_expression import Regex
 
 import numpy as np
 
+from project.query_cache import QueryCache, default_cache, normalize_text
+
+
+def _state_key(state: State) -> Tuple:
+    """Sort key of DFA states: integer states by number, others by text"""
+    value = state.value
+    if isinstance(value, int):
+        return 0, value, ""
+    return 1, 0, str(value)
+
+
+def _acyclic_dfa(bodies: List[Sequence]) -> DeterministicFiniteAutomaton:
+    """
+    Minimal DFA accepting exactly the given bodies: a trie of the bodies
+    with equal subtries merged, numbered so that the start state is 0
+    """
+    children = [dict()]
+    final = [False]
+    for body in bodies:
+        state = 0
+        for symbol in body:
+            next_state = children[state].get(symbol)
+            if next_state is None:
+                next_state = children[state][symbol] = len(children)
+                children.append(dict())
+                final.append(False)
+            state = next_state
+        final[state] = True
+
+    # children are created after their parents, so a reversed pass sees
+    # every state after all of its children
+    ids = [0] * len(children)
+    signatures = dict()
+    for state in reversed(range(len(children))):
+        signature = (
+            final[state],
+            tuple(
+                sorted(
+                    ((symbol, ids[child]) for symbol, child in children[state].items()),
+                    key=lambda edge: (str(edge[0]), edge[1]),
+                )
+            ),
+        )
+        ids[state] = signatures.setdefault(signature, len(signatures))
+
+    last = len(signatures) - 1
+    dfa = DeterministicFiniteAutomaton()
+    dfa.add_start_state(State(last - ids[0]))
+    for (is_final, edges), i in signatures.items():
+        if is_final:
+            dfa.add_final_state(State(last - i))
+        for symbol, child in edges:
+            dfa.add_transition(State(last - i), Symbol(symbol), State(last - child))
+    return dfa
+
 
 @dataclass
 class RFA:
@@ -19,23 +74,62 @@ class RFA:
     start_symbol: Variable
     dfas: Dict[Variable, DeterministicFiniteAutomaton]
 
-    def to_matrices(self):
-        all_states = set()
-        for var, dfa in self.dfas.items():
-            for x in dfa.states:
-                all_states.add((var, x))
-        state_idx = {k: i for i, k in enumerate(all_states)}
+    @staticmethod
+    def from_cfg(cfg: CFG) -> "RFA":
+        """
+        Build RFA straight from CFG productions: the box of every head is
+        the minimal DFA of its bodies, no regular expressions are parsed
+        """
+        bodies = dict()
+        for prod in cfg.productions:
+            bodies.setdefault(prod.head, []).append([e.value for e in prod.body])
+        return RFA(
+            start_symbol=cfg.start_symbol,
+            dfas={head: _acyclic_dfa(lst) for head, lst in bodies.items()},
+        )
+
+    def to_matrices(self) -> Tuple[Dict[Symbol, csr_matrix], Dict[Tuple, int]]:
+        """
+        Boolean CSR matrix per symbol and `(var, state) -> index` mapping.
+        Boxes are numbered in order of head names and states of a box get
+        contiguous indices in state order, so equal RFAs give equal matrices.
+        """
+        heads = sorted(self.dfas.keys(), key=str)
+        state_idx = dict()
+        for var in heads:
+            for state in sorted(self.dfas[var].states, key=_state_key):
+                state_idx[(var, state)] = len(state_idx)
+
+        coords = dict()
+        for var in heads:
+            for fro, symb, to in self.dfas[var]:
+                rows, cols = coords.setdefault(symb, ([], []))
+                rows.append(state_idx[(var, fro)])
+                cols.append(state_idx[(var, to)])
         n_states = len(state_idx)
-        result = dict()
-        for var, dfa in self.dfas.items():
-            for fro, symb, to in dfa:
-                mat = result.setdefault(
-                    symb, dok_matrix((n_states, n_states), dtype=np.bool_)
-                )
-                mat[state_idx[(var, fro)], state_idx[(var, to)]] = True
+        result = {
+            symb: csr_matrix(
+                (np.ones(len(rows), dtype=np.bool_), (rows, cols)),
+                shape=(n_states, n_states),
+                dtype=np.bool_,
+            )
+            for symb, (rows, cols) in sorted(
+                coords.items(), key=lambda item: str(item[0])
+            )
+        }
         return result, state_idx
 
 
+def compile_rfa(cfg: CFG, cache: QueryCache = None) -> RFA:
+    """
+    Returns RFA of the grammar built by :meth:`RFA.from_cfg`, reusing it
+    from the cache
+    """
+    lines = sorted(normalize_text(cfg.to_text()).splitlines())
+    key = "\n".join([f"rfa:{cfg.start_symbol}"] + lines)
+    return (cache or default_cache).get(key, lambda: RFA.from_cfg(cfg))
+
+
 class ECFG:
     """
     Extended context-free grammar
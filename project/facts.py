@@ -0,0 +1,130 @@
+from typing import Any, Dict, Iterable, Iterator, List, Set, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from project.bitmatrix import to_sparse
+
+
+class FactStore:
+    """
+    CFPQ facts `(u, var, v)` stored as integers.
+    Nodes are numbered by position in `nodes` and variables by position in
+    `variables`; the facts of every variable are one sorted `int64` array of
+    keys `u * n + v`, 8 bytes per fact. Membership and successors are binary
+    searches in these arrays, predecessors use transposed keys built on
+    first use. Tuples are only created by :meth:`to_set` and iteration.
+    """
+
+    def __init__(self, nodes: List[Any], variables: List[Any], keys: List[np.ndarray]):
+        self.nodes = nodes
+        self.variables = variables
+        self.keys = keys
+        self._node_idx = None
+        self._var_idx = {var: i for i, var in enumerate(variables)}
+        self._transposed = None
+        self._set = None
+
+    @staticmethod
+    def from_matrices(nodes: List[Any], matrices: Dict[Any, Any]) -> "FactStore":
+        """Facts of per variable boolean matrices (CSR or packed)"""
+        n = len(nodes)
+        variables = list(matrices.keys())
+        keys = []
+        for var in variables:
+            matrix = csr_matrix(to_sparse(matrices[var]))
+            matrix.sum_duplicates()
+            matrix.sort_indices()
+            rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(matrix.indptr))
+            keys.append(rows * n + matrix.indices.astype(np.int64))
+        return FactStore(nodes, variables, keys)
+
+    @staticmethod
+    def from_facts(nodes: List[Any], facts: Iterable[Tuple]) -> "FactStore":
+        """Facts given as `(u, var, v)` tuples over `nodes`"""
+        n = len(nodes)
+        node_idx = {v: i for i, v in enumerate(nodes)}
+        var_idx = dict()
+        keys = []
+        for u, var, v in facts:
+            i = var_idx.get(var)
+            if i is None:
+                i = var_idx[var] = len(keys)
+                keys.append([])
+            keys[i].append(node_idx[u] * n + node_idx[v])
+        return FactStore(
+            nodes,
+            list(var_idx.keys()),
+            [np.unique(np.array(k, dtype=np.int64)) for k in keys],
+        )
+
+    @property
+    def node_idx(self) -> Dict[Any, int]:
+        if self._node_idx is None:
+            self._node_idx = {v: i for i, v in enumerate(self.nodes)}
+        return self._node_idx
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the key arrays, transposed ones included once built"""
+        arrays = self.keys + (self._transposed or [])
+        return sum(a.nbytes for a in arrays)
+
+    def __len__(self) -> int:
+        return sum(len(k) for k in self.keys)
+
+    def __contains__(self, fact: Tuple) -> bool:
+        u, var, v = fact
+        i = self._var_idx.get(var)
+        node_idx = self.node_idx
+        if i is None or u not in node_idx or v not in node_idx:
+            return False
+        keys = self.keys[i]
+        key = node_idx[u] * len(self.nodes) + node_idx[v]
+        pos = np.searchsorted(keys, key)
+        return bool(pos < len(keys) and keys[pos] == key)
+
+    def __iter__(self) -> Iterator[Tuple]:
+        nodes = self.nodes
+        for var, (rows, cols) in zip(self.variables, map(self._split, self.keys)):
+            for i, j in zip(rows.tolist(), cols.tolist()):
+                yield nodes[i], var, nodes[j]
+
+    def pairs(self, var) -> Tuple[np.ndarray, np.ndarray]:
+        """Node numbers `(us, vs)` of all facts of `var`"""
+        i = self._var_idx.get(var)
+        if i is None:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        return self._split(self.keys[i])
+
+    def successors(self, u, var) -> List[Any]:
+        """Nodes `v` with fact `(u, var, v)`"""
+        return self._adjacent(self.keys, u, var)
+
+    def predecessors(self, v, var) -> List[Any]:
+        """Nodes `u` with fact `(u, var, v)`"""
+        if self._transposed is None:
+            self._transposed = [
+                np.sort(cols * len(self.nodes) + rows)
+                for rows, cols in map(self._split, self.keys)
+            ]
+        return self._adjacent(self._transposed, v, var)
+
+    def to_set(self) -> Set[Tuple]:
+        """Facts as the tuple set returned by the CFPQ functions, built once"""
+        if self._set is None:
+            self._set = set(self)
+        return self._set
+
+    def _split(self, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return np.divmod(keys, max(1, len(self.nodes)))
+
+    def _adjacent(self, keys: List[np.ndarray], node, var) -> List[Any]:
+        i = self._var_idx.get(var)
+        if i is None or node not in self.node_idx:
+            return []
+        n = len(self.nodes)
+        x = self.node_idx[node]
+        begin, end = np.searchsorted(keys[i], [x * n, (x + 1) * n])
+        return [self.nodes[j] for j in (keys[i][begin:end] % n).tolist()]
@@ -1,13 +1,39 @@
 import cfpq_data
 import networkx as nx
-from collections import namedtuple
-from typing import Set, Tuple, Dict, Any, Iterable
-from scipy.sparse import dok_matrix
+from collections import namedtuple, deque
+import os
+from array import array
+import time
+from contextlib import nullcontext
+from typing import Set, Tuple, Dict, Any, Iterable, Iterator, List
+from scipy.sparse import csr_matrix, kron, vstack
 
 import numpy as np
 from pyformlang.cfg.cfg import CFG, Variable
 
-from project.cfg import cfg_to_whnf
+from project.bitmatrix import (
+    PACKED_DENSITY,
+    bool_andnot,
+    bool_matmul,
+    bool_matmul_many,
+    bool_nnz,
+    bool_or,
+    choose_backend,
+    to_sparse,
+)
+from project.cfg import CompiledGrammar, compile_grammar
+from project.dfa_utils import IterationInfo, transitive_closure
+from project.ecfg import ECFG, RFA, compile_rfa
+from project.facts import FactStore
+from project.parallel import MatrixPool
+from project.graph_index import (
+    GraphIndex,
+    as_graph_index,
+    convert_graph,
+    csr_row_entries,
+    load_graph_index,
+    read_edge_list,
+)
 
 GraphInfo = namedtuple("GraphInfo", ["nodes_count", "edges_count", "labels_set"])
 
@@ -17,12 +43,25 @@ def load_graph(name: str) -> nx.MultiDiGraph:
     return cfpq_data.graph_from_csv(cfpq_data.download(name))
 
 
+def load_graph_mmap(name: str, directory: str) -> GraphIndex:
+    """
+    Loads graph by name as memory-mapped :class:`GraphIndex`,
+    converting the downloaded CSV into `directory` on first use
+    """
+    path = os.path.join(directory, name)
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        convert_graph(str(cfpq_data.download(name)), path)
+    return load_graph_index(path)
+
+
 def save_graph(graph: nx.MultiDiGraph, path: str):
     nx.drawing.nx_pydot.write_dot(graph, path)
 
 
-def graph_info(graph: nx.MultiDiGraph) -> GraphInfo:
-    """Returns summary about graph :class:`nx.MultiDiGraph`"""
+def graph_info(graph: nx.MultiDiGraph | GraphIndex) -> GraphInfo:
+    """Returns summary about graph :class:`nx.MultiDiGraph` or :class:`GraphIndex`"""
+    if isinstance(graph, GraphIndex):
+        return GraphInfo(graph.n_nodes, graph.n_edges, set(graph.labels))
     return GraphInfo(
         graph.number_of_nodes(),
         graph.number_of_edges(),
@@ -46,114 +85,675 @@ def get_graph_info_by_name(name: str) -> GraphInfo:
     return graph_info(load_graph(name=name))
 
 
-def hellings_cfpq(cfg: CFG, graph: nx.MultiDiGraph) -> Set[Tuple]:
+class HellingsWorklist:
+    """
+    Facts of Hellings' algorithm with the worklist of facts not joined yet.
+    Nodes and variables are interned as integers, every fact `(u, var, v)`
+    is the integer key `((u << 32) | v) * n_vars + var`. Facts are indexed
+    by source and by target node in `array`s of packed `(var, node)` ints,
+    so every fact taken from the worklist is joined only with the facts
+    adjacent to it. Tuples of node and variable names are built only when
+    facts are returned.
+    """
+
+    def __init__(self, grammar: CompiledGrammar, nodes: Iterable = ()):
+        self.grammar = grammar
+        self.variables = sorted(grammar.wcnf.variables, key=str)
+        self.var_idx = {var: i for i, var in enumerate(self.variables)}
+        self.n_vars = max(1, len(self.variables))
+        var_idx, n_vars = self.var_idx, self.n_vars
+        self.epsilon_heads = [var_idx[head] for head in grammar.epsilon_heads]
+        self.terminal_heads = {
+            label: [var_idx[head] for head in heads]
+            for label, heads in grammar.terminal_heads.items()
+        }
+        self.binary_heads = {
+            var_idx[left] * n_vars + var_idx[right]: [var_idx[head] for head in heads]
+            for (left, right), heads in grammar.binary_heads.items()
+        }
+        self.nodes = []
+        self.node_idx = dict()
+        self.keys = set()
+        self.queue = deque()
+        self.by_source: List[array] = []
+        self.by_target: List[array] = []
+        for node in nodes:
+            self.intern(node)
+
+    def intern(self, node) -> int:
+        """Number of the node, assigned on first use"""
+        i = self.node_idx.get(node)
+        if i is None:
+            i = self.node_idx[node] = len(self.nodes)
+            self.nodes.append(node)
+            self.by_source.append(array("q"))
+            self.by_target.append(array("q"))
+        return i
+
+    def add(self, u: int, var: int, v: int) -> bool:
+        key = ((u << 32) | v) * self.n_vars + var
+        if key in self.keys:
+            return False
+        self.keys.add(key)
+        self.queue.append(key)
+        self.by_source[u].append(v * self.n_vars + var)
+        self.by_target[v].append(u * self.n_vars + var)
+        return True
+
+    def decode(self, key: int) -> Tuple[int, int, int]:
+        """Node and variable numbers `(u, var, v)` of a fact key"""
+        rest, var = divmod(key, self.n_vars)
+        return rest >> 32, var, rest & 0xFFFFFFFF
+
+    def fact(self, key: int) -> Tuple:
+        """Fact key as `(u, var, v)` of names"""
+        u, var, v = self.decode(key)
+        return self.nodes[u], self.variables[var], self.nodes[v]
+
+    @property
+    def result(self) -> Set[Tuple]:
+        """All facts as `(u, var, v)` tuples of names"""
+        return {self.fact(key) for key in self.keys}
+
+    def pairs(self, var) -> Set[Tuple]:
+        """Pairs of node names of all facts of `var`"""
+        i = self.var_idx.get(var)
+        if i is None:
+            return set()
+        nodes, n_vars = self.nodes, self.n_vars
+        return {
+            (nodes[(key // n_vars) >> 32], nodes[(key // n_vars) & 0xFFFFFFFF])
+            for key in self.keys
+            if key % n_vars == i
+        }
+
+    def add_node(self, node):
+        """Seed epsilon facts of a node"""
+        i = self.intern(node)
+        for head in self.epsilon_heads:
+            self.add(i, head, i)
+
+    def add_edge(self, u, label, v):
+        """Seed facts of an edge"""
+        heads = self.terminal_heads.get(label, ())
+        if heads:
+            i, j = self.intern(u), self.intern(v)
+            for head in heads:
+                self.add(i, head, j)
+
+    def run(self) -> List[Tuple]:
+        """Join facts until the worklist is empty, return facts taken from it"""
+        return list(self.iterate())
+
+    def iterate(self) -> Iterator[Tuple]:
+        """Join facts lazily, yielding every fact taken from the worklist"""
+        return map(self.fact, self.iterate_keys())
+
+    def close(self):
+        """Join facts until the worklist is empty"""
+        for _ in self.iterate_keys():
+            pass
+
+    def iterate_keys(self) -> Iterator[int]:
+        """Join facts lazily, yielding the key of every fact taken"""
+        binary_heads, n_vars = self.binary_heads, self.n_vars
+        by_source, by_target = self.by_source, self.by_target
+        while self.queue:
+            key = self.queue.popleft()
+            yield key
+            u, var, v = self.decode(key)
+            # facts added while joining are joined when they are taken
+            incoming = by_target[u]
+            for k in range(len(incoming)):
+                uu, var1 = divmod(incoming[k], n_vars)
+                for head in binary_heads.get(var1 * n_vars + var, ()):
+                    self.add(uu, head, v)
+            outgoing = by_source[v]
+            for k in range(len(outgoing)):
+                vv, var1 = divmod(outgoing[k], n_vars)
+                for head in binary_heads.get(var * n_vars + var1, ()):
+                    self.add(u, head, vv)
+
+    def to_store(self) -> FactStore:
+        """Facts as a :class:`FactStore` over the interned nodes"""
+        keys = np.fromiter(self.keys, dtype=np.int64, count=len(self.keys))
+        rest, var = np.divmod(keys, self.n_vars)
+        n = len(self.nodes)
+        pairs = (rest >> 32) * n + (rest & 0xFFFFFFFF)
+        present = np.unique(var)
+        return FactStore(
+            self.nodes,
+            [self.variables[i] for i in present.tolist()],
+            [np.sort(pairs[var == i]) for i in present],
+        )
+
+
+def _hellings_worklist(cfg: CFG, index: GraphIndex) -> HellingsWorklist:
+    worklist = HellingsWorklist(compile_grammar(cfg), index.nodes)
+    for node in index.nodes:
+        worklist.add_node(node)
+    for symb, matrix in index.adjacency.items():
+        heads = worklist.terminal_heads.get(symb, ())
+        for i, j in zip(*matrix.nonzero()):
+            for head in heads:
+                worklist.add(int(i), head, int(j))
+    return worklist
+
+
+def hellings_cfpq(
+    cfg: CFG, graph: nx.MultiDiGraph | GraphIndex, store: bool = False
+) -> Set[Tuple] | FactStore:
     """
     Hellings' algorithm
+    With `store` the facts are returned as a :class:`FactStore`.
+    Shortest paths witnessing the facts are given by
+    :class:`project.provenance.CFPQProvenance`
     """
-    cfg = cfg_to_whnf(cfg)
-
-    queue = []
-    result = set()
-
-    for prod in cfg.productions:
-        if len(prod.body) == 0:
-            for node in graph.nodes:
-                t = (node, prod.head, node)
-                result.add(t)
-                queue.append(t)
-        elif len(prod.body) == 1:
-            for u, v, symb in graph.edges.data(data="label"):
-                if Variable(symb) == prod.body[0]:
-                    t = (u, prod.head, v)
-                    result.add(t)
-                    queue.append(t)
-
-    while len(queue) != 0:
-        u, var, v = queue.pop(0)
-        diff = set()
-        for uu, var1, vv in result:
-            if vv == u:
-                for prod in cfg.productions:
-                    if prod.body == [var1, var]:
-                        diff.add((uu, prod.head, v))
-            if uu == v:
-                for prod in cfg.productions:
-                    if prod.body == [var, var1]:
-                        diff.add((u, prod.head, vv))
-        diff = diff.difference(result)
-        queue.extend(diff)
-        result = result.union(diff)
-    return result
+    worklist = _hellings_worklist(cfg, as_graph_index(graph))
+    worklist.close()
+    facts = worklist.to_store()
+    return facts if store else facts.to_set()
 
 
 def query_cfg_graph(
-    cfg: CFG, graph: nx.MultiDiGraph, S: Variable, starts: Iterable, finals: Iterable
+    cfg: CFG,
+    graph: nx.MultiDiGraph | GraphIndex,
+    S: Variable,
+    starts: Iterable,
+    finals: Iterable,
+    algorithm: str = "hellings",
 ) -> Dict[Any, Set]:
     """
     Query graph representing a finite automaton with a context-free grammar
     Parameters
     ----------
+    algorithm: one of "hellings", "matrix" or "tensor"
     """
+    engines = {
+        "hellings": hellings_cfpq,
+        "matrix": apply_matrix_alg,
+        "tensor": lambda cfg, index, store: tensor_cfpq(
+            cfg, index, starts, store=store
+        ),
+    }
+    index = as_graph_index(graph)
+    store = engines[algorithm](cfg, index, store=True)
+    node_idx = index.node_idx
+    start_mask = np.zeros(index.n_nodes, dtype=np.bool_)
+    start_mask[[node_idx[u] for u in starts if u in node_idx]] = True
+    final_mask = np.zeros(index.n_nodes, dtype=np.bool_)
+    final_mask[[node_idx[v] for v in finals if v in node_idx]] = True
+
     result = {u: set() for u in starts}
-    tuples = hellings_cfpq(cfg, graph)
-    for u, var1, v in tuples:
-        if var1 == S and u in starts and v in finals:
-            result[u].add(v)
+    us, vs = store.pairs(S)
+    selected = start_mask[us] & final_mask[vs]
+    for i, j in zip(us[selected].tolist(), vs[selected].tolist()):
+        result[index.nodes[i]].add(index.nodes[j])
     return result
 
 
-def apply_matrix_alg(cfg: CFG, graph: nx.MultiDiGraph) -> Set[Tuple]:
+def query_cfg_iter(
+    cfg: CFG,
+    graph: nx.MultiDiGraph | GraphIndex,
+    S: Variable,
+    starts: Iterable,
+    finals: Iterable,
+    limit: int = None,
+    target: Tuple = None,
+) -> Iterator[Tuple]:
+    """
+    Yield pairs `(u, v)` of :func:`query_cfg_graph` while Hellings'
+    algorithm is still running
+    Parameters
+    ----------
+    limit: stop after this many pairs
+    target: `(start, final)` pair, stop as soon as it is derived
+    """
+    if limit is not None and limit <= 0:
+        return
+    if target is not None:
+        starts, finals = [target[0]], [target[1]]
+    worklist = _hellings_worklist(cfg, as_graph_index(graph))
+    node_idx = worklist.node_idx
+    starts = {node_idx[u] for u in starts if u in node_idx}
+    finals = {node_idx[v] for v in finals if v in node_idx}
+    s_idx = worklist.var_idx.get(S)
+    count = 0
+    for key in worklist.iterate_keys():
+        u, var, v = worklist.decode(key)
+        if var == s_idx and u in starts and v in finals:
+            yield worklist.nodes[u], worklist.nodes[v]
+            count += 1
+            if target is not None or (limit is not None and count >= limit):
+                return
+
+
+def _bool_matrix(rows, cols, n: int) -> csr_matrix:
+    return csr_matrix(
+        (np.ones(len(rows), dtype=np.bool_), (rows, cols)),
+        shape=(n, n),
+        dtype=np.bool_,
+    )
+
+
+def _matrix_round(matrices: Dict, binary_heads: Dict) -> bool:
+    matrices_changed = False
+    for (var_a, var_b), heads in binary_heads.items():
+        product = bool_matmul(matrices[var_a], matrices[var_b])
+        if bool_nnz(product) == 0:
+            continue
+        for head in heads:
+            updated = bool_or(matrices[head], product)
+            if bool_nnz(updated) != bool_nnz(matrices[head]):
+                matrices[head] = updated
+                matrices_changed = True
+    return matrices_changed
+
+
+def _matrix_parallel_round(matrices: Dict, binary_heads: Dict, matmul_many) -> bool:
+    """
+    Round with all products computed at once from the matrices of the
+    previous round, so they can run on a :class:`MatrixPool`
+    """
+    bodies = list(binary_heads.keys())
+    products = matmul_many([(matrices[a], matrices[b]) for a, b in bodies])
+    matrices_changed = False
+    for body, product in zip(bodies, products):
+        for head in binary_heads[body]:
+            updated = bool_or(matrices[head], product)
+            if bool_nnz(updated) != bool_nnz(matrices[head]):
+                matrices[head] = updated
+                matrices_changed = True
+    return matrices_changed
+
+
+def _matrix_delta_round(
+    matrices: Dict, deltas: Dict, binary_heads: Dict, matmul_many=bool_matmul_many
+) -> bool:
+    """
+    Semi-naive round: a product is new only if one of its factors is new,
+    so `dA @ B + A @ dB` covers everything not derived before
+    """
+    bodies = [
+        (var_a, var_b)
+        for var_a, var_b in binary_heads.keys()
+        if bool_nnz(deltas[var_a]) != 0 or bool_nnz(deltas[var_b]) != 0
+    ]
+    pairs = []
+    for var_a, var_b in bodies:
+        pairs.append((deltas[var_a], matrices[var_b]))
+        pairs.append((matrices[var_a], deltas[var_b]))
+    products = matmul_many(pairs)
+
+    candidates = dict()
+    for i, body in enumerate(bodies):
+        product = bool_or(products[2 * i], products[2 * i + 1])
+        for head in binary_heads[body]:
+            if head in candidates:
+                candidates[head] = bool_or(candidates[head], product)
+            else:
+                candidates[head] = product
+    deltas.clear()
+    n = next(iter(matrices.values())).shape[0] if matrices else 0
+    for var in matrices:
+        if var in candidates:
+            deltas[var] = bool_andnot(candidates[var], matrices[var])
+            matrices[var] = bool_or(matrices[var], deltas[var])
+        else:
+            deltas[var] = csr_matrix((n, n), dtype=np.bool_)
+    return any(bool_nnz(d) != 0 for d in deltas.values())
+
+
+def _matrix_fixpoint(
+    matrices: Dict,
+    binary_heads: Dict,
+    delta: bool,
+    packed_density: float,
+    pool: MatrixPool,
+    stats: List[IterationInfo],
+):
+    deltas = dict(matrices)
+    iteration = 0
+    matrices_changed = True
+    while matrices_changed:
+        began = time.perf_counter()
+        for var, matrix in matrices.items():
+            matrices[var] = choose_backend(matrix, packed_density)
+        if delta:
+            matrices_changed = _matrix_delta_round(
+                matrices,
+                deltas,
+                binary_heads,
+                pool.matmul_many if pool is not None else bool_matmul_many,
+            )
+        elif pool is not None:
+            matrices_changed = _matrix_parallel_round(
+                matrices, binary_heads, pool.matmul_many
+            )
+        else:
+            matrices_changed = _matrix_round(matrices, binary_heads)
+        iteration += 1
+        if stats is not None:
+            stats.append(
+                IterationInfo(
+                    iteration,
+                    time.perf_counter() - began,
+                    sum(bool_nnz(m) for m in matrices.values()),
+                )
+            )
+
+
+def apply_matrix_alg(
+    cfg: CFG,
+    graph: nx.MultiDiGraph | GraphIndex,
+    stats: List[IterationInfo] = None,
+    delta: bool = False,
+    packed_density: float = PACKED_DENSITY,
+    workers: int = None,
+    store: bool = False,
+) -> Set[Tuple] | FactStore:
     """
     Apply matrix algorithm to a graph
+
+    Every variable is a boolean CSR matrix; each round performs one sparse
+    product per distinct binary body and detects changes by the nnz count.
+    If `stats` is given, an :class:`IterationInfo` is appended per round.
+    With `delta` the rounds are semi-naive: only the cells added in the
+    previous round are multiplied against the full matrices.
+    Matrices with at least `packed_density` share of cells set switch to
+    the bit-packed :class:`BitMatrix` backend (None keeps all of them sparse).
+    With `workers` > 1 the products of a round are split by production and
+    by row block over a :class:`MatrixPool`.
+    With `store` the facts are returned as a :class:`FactStore`.
     """
-    cfg = cfg_to_whnf(cfg)
-    node_idx = {v: i for i, v in enumerate(graph.nodes)}
-    n = len(node_idx)
-    matrices = {var: dok_matrix((n, n), dtype=np.bool_) for var in cfg.variables}
-    for prod in cfg.productions:
-        if len(prod.body) == 0:
-            for i in range(n):
-                matrices[prod.head][i, i] = True
-        elif len(prod.body) == 1:
-            for u, v, symb in graph.edges.data(data="label"):
-                if Variable(symb) == prod.body[0]:
-                    i = node_idx[u]
-                    j = node_idx[v]
-                    matrices[prod.head][i, j] = True
-
-    while True:
-        matrices_changed = False
-
-        # Matrix multiplication
-        for prod in cfg.productions:
-            if len(prod.body) != 2:
-                continue
-            for var_a in matrices:
-                for var_b in matrices:
-                    if [var_a, var_b] != prod.body:
-                        continue
-
-                    for i in range(n):
-                        for j in range(n):
-                            for k in range(n):
-                                if (
-                                    matrices[var_a][i, j]
-                                    and matrices[var_b][j, k]
-                                    and not matrices[prod.head][i, k]
-                                ):
-                                    matrices[prod.head][i, k] = True
-                                    matrices_changed = True
-
-        if not matrices_changed:
-            break
-
-    result = set()
-    nodes = list(graph.nodes)
-    for var in cfg.variables:
-        xs, ys = matrices[var].nonzero()
-        for i in range(len(xs)):
-            result.add((nodes[xs[i]], var, nodes[ys[i]]))
-    return result
+    grammar = compile_grammar(cfg)
+    terminal_heads, binary_heads = grammar.terminal_heads, grammar.binary_heads
+    variables = grammar.wcnf.variables
+    index = as_graph_index(graph)
+    n = index.n_nodes
+
+    matrices = {var: _bool_matrix([], [], n) for var in variables}
+    for head in grammar.epsilon_heads:
+        matrices[head] = _bool_matrix(range(n), range(n), n)
+    for symb, matrix in index.adjacency.items():
+        for head in terminal_heads.get(symb, ()):
+            matrices[head] = matrices[head] + matrix
+
+    pool = MatrixPool(workers) if workers is not None and workers > 1 else None
+    with pool or nullcontext():
+        _matrix_fixpoint(matrices, binary_heads, delta, packed_density, pool, stats)
+
+    facts = FactStore.from_matrices(
+        index.nodes, {var: matrices[var] for var in variables}
+    )
+    return facts if store else facts.to_set()
+
+
+def _selection(index: GraphIndex, nodes: Iterable) -> csr_matrix:
+    """Diagonal matrix keeping rows or columns of `nodes`, all if None"""
+    if nodes is None:
+        picked = range(index.n_nodes)
+    else:
+        picked = [index.node_idx[v] for v in nodes if v in index.node_idx]
+    return _bool_matrix(picked, picked, index.n_nodes)
+
+
+def _box_indices(rfa: RFA, state_idx: Dict) -> Tuple[List, np.ndarray, np.ndarray]:
+    """
+    Number RFA boxes and mark for every RFA state the box it starts or
+    finishes (-1 for neither)
+    """
+    heads = list(rfa.dfas.keys())
+    start_of = np.full(len(state_idx), -1)
+    final_of = np.full(len(state_idx), -1)
+    for i, head in enumerate(heads):
+        dfa = rfa.dfas[head]
+        if dfa.start_state is not None:
+            start_of[state_idx[(head, dfa.start_state)]] = i
+        for state in dfa.final_states:
+            final_of[state_idx[(head, state)]] = i
+    return heads, start_of, final_of
+
+
+def _tensor_product(rfa_matrices: Dict, matrices: List, n_product: int) -> csr_matrix:
+    """Sum of `kron(rfa_matrices[symbol], matrix)` over `(symbol, matrix)` pairs"""
+    product = csr_matrix((n_product, n_product), dtype=np.bool_)
+    for symb, matrix in matrices:
+        if matrix is not None and matrix.nnz != 0:
+            product = product + kron(rfa_matrices[symb], matrix, format="csr")
+    return product
+
+
+def _new_facts(
+    variables: List[csr_matrix], box, rows, cols, n: int
+) -> List[Tuple[int, csr_matrix]]:
+    """
+    Add facts `box[k]: rows[k] -> cols[k]` to `variables`, return the
+    boxes that got new facts with the new facts only
+    """
+    added = []
+    for i in np.unique(box):
+        selected = box == i
+        found = _bool_matrix(rows[selected], cols[selected], n) > variables[i]
+        if found.nnz != 0:
+            variables[i] = variables[i] + found
+            added.append((i, found))
+    return added
+
+
+def _tensor_fixpoint(
+    rfa_matrices: Dict,
+    box_symbols: List,
+    added: csr_matrix,
+    variables: List[csr_matrix],
+    start_of: np.ndarray,
+    final_of: np.ndarray,
+    n: int,
+    pool: MatrixPool,
+) -> List[csr_matrix]:
+    """
+    All-pairs fixpoint: the closure of the product is extended every round
+    with the Kronecker products of the facts found in the previous round
+    only, `added` is the initial product
+    """
+    n_product = len(start_of) * n
+    closure = csr_matrix((n_product, n_product), dtype=np.bool_)
+    while added.nnz != 0:
+        updated = transitive_closure(added, closed=closure, pool=pool)
+        rows, cols = (updated > closure).nonzero()
+        closure = updated
+
+        box = start_of[rows // n]
+        mask = (box >= 0) & (box == final_of[cols // n])
+        found = _new_facts(variables, box[mask], rows[mask] % n, cols[mask] % n, n)
+        added = _tensor_product(
+            rfa_matrices,
+            [
+                (box_symbols[i], delta)
+                for i, delta in found
+                if box_symbols[i] is not None
+            ],
+            n_product,
+        )
+    return variables
+
+
+def _tensor_sources_fixpoint(
+    rfa_matrices: Dict,
+    box_symbols: List,
+    added: csr_matrix,
+    variables: List[csr_matrix],
+    start_of: np.ndarray,
+    final_of: np.ndarray,
+    n: int,
+    sources: List[int],
+    pool: MatrixPool,
+) -> List[csr_matrix]:
+    """
+    Multiple-source fixpoint: instead of the closure only the product
+    states reachable from `(box start, source)` pairs are kept, one row
+    per pair. Sources are every box at `sources` and, once reached, every
+    box called by a reached RFA state at the node it is called from.
+    Facts of a box are complete for the nodes it is a source at.
+    """
+    matmul_many = pool.matmul_many if pool is not None else bool_matmul_many
+    n_boxes = len(variables)
+    n_product = len(start_of) * n
+    box_starts = np.full(n_boxes, -1)
+    box_starts[start_of[start_of >= 0]] = np.flatnonzero(start_of >= 0)
+    calls_rows, calls_cols = [], []
+    for i, symb in enumerate(box_symbols):
+        if symb is not None:
+            states = np.unique(rfa_matrices[symb].nonzero()[0])
+            calls_rows.extend(states.tolist())
+            calls_cols.extend([i] * len(states))
+    calls = csr_matrix(
+        (np.ones(len(calls_rows), dtype=np.bool_), (calls_rows, calls_cols)),
+        shape=(len(start_of), n_boxes),
+        dtype=np.bool_,
+    )
+
+    is_source = np.zeros(n_boxes * n, dtype=np.bool_)
+    row_box, row_node = np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    reached = csr_matrix((0, n_product), dtype=np.bool_)
+    product = csr_matrix((n_product, n_product), dtype=np.bool_)
+    keys = (np.arange(n_boxes)[:, None] * n + np.asarray(sources, dtype=int)).ravel()
+    while added.nnz != 0 or len(keys):
+        # new sources start a row each, old rows move along the new edges
+        keys = np.unique(keys[~is_source[keys] & (box_starts[keys // n] >= 0)])
+        is_source[keys] = True
+        boxes, nodes = np.divmod(keys, n)
+        seeds = csr_matrix(
+            (
+                np.ones(len(keys), dtype=np.bool_),
+                (np.arange(len(keys)), box_starts[boxes] * n + nodes),
+            ),
+            shape=(len(keys), n_product),
+            dtype=np.bool_,
+        )
+        product = product + added
+        (moved,) = matmul_many([(reached, added)])
+        front = to_sparse(moved) > reached
+        reached = vstack([reached, seeds], format="csr")
+        front = vstack([front, seeds], format="csr")
+        row_box = np.concatenate([row_box, boxes])
+        row_node = np.concatenate([row_node, nodes])
+        new_rows, new_cols = [], []
+        while front.nnz != 0:
+            reached = reached + front
+            rows, cols = front.nonzero()
+            new_rows.append(rows)
+            new_cols.append(cols)
+            (moved,) = matmul_many([(front, product)])
+            front = to_sparse(moved) > reached
+        rows = np.concatenate(new_rows) if new_rows else np.zeros(0, dtype=int)
+        cols = np.concatenate(new_cols) if new_cols else np.zeros(0, dtype=int)
+
+        states, nodes = np.divmod(cols, n)
+        mask = row_box[rows] == final_of[states]
+        found = _new_facts(
+            variables, row_box[rows[mask]], row_node[rows[mask]], nodes[mask], n
+        )
+        added = _tensor_product(
+            rfa_matrices,
+            [
+                (box_symbols[i], delta)
+                for i, delta in found
+                if box_symbols[i] is not None
+            ],
+            n_product,
+        )
+        owner, called = csr_row_entries(calls, states)
+        keys = called * n + nodes[owner]
+    return variables
+
+
+def tensor_cfpq(
+    grammar: CFG | ECFG | RFA,
+    graph: nx.MultiDiGraph | GraphIndex,
+    starts: Iterable = None,
+    finals: Iterable = None,
+    workers: int = None,
+    store: bool = False,
+) -> Set[Tuple] | FactStore:
+    """
+    Tensor algorithm
+
+    Builds the Kronecker product of RFA and graph matrices and keeps its
+    transitive closure up to date: every round only the products of the
+    facts found in the previous round are added and closed over. The
+    grammar is never converted to WCNF. `workers` > 1 runs the closure
+    products on a :class:`MatrixPool`.
+    If `starts` are given, the closure is replaced by a search from the
+    box starts at `starts` (and at the nodes boxes are called from), so
+    only facts needed for these sources are derived; `workers` then run
+    the products of the search fronts. Only facts from
+    `starts` to `finals` are returned, `finals` is a filter of the result.
+    With `store` the facts are returned as a :class:`FactStore`.
+    """
+    if isinstance(grammar, CFG):
+        rfa = compile_rfa(grammar)
+    else:
+        rfa = grammar.to_rfa() if isinstance(grammar, ECFG) else grammar
+
+    rfa_matrices, state_idx = rfa.to_matrices()
+    heads, start_of, final_of = _box_indices(rfa, state_idx)
+    head_names = [getattr(head, "value", head) for head in heads]
+    head_ids = {name: i for i, name in enumerate(head_names)}
+
+    index = as_graph_index(graph)
+    nodes = index.nodes
+    n = index.n_nodes
+    labels = index.adjacency
+
+    diagonal = list(range(n))
+    variables = [_bool_matrix([], [], n) for _ in heads]
+    for i, head in enumerate(heads):
+        dfa = rfa.dfas[head]
+        if dfa.start_state in dfa.final_states:
+            variables[i] = _bool_matrix(diagonal, diagonal, n)
+    box_symbols = [None] * len(heads)
+    for symb in rfa_matrices:
+        if symb.value in head_ids:
+            box_symbols[head_ids[symb.value]] = symb
+    added = _tensor_product(
+        rfa_matrices,
+        [(symb, labels.get(symb.value)) for symb in rfa_matrices]
+        + [
+            (symb, variables[i])
+            for i, symb in enumerate(box_symbols)
+            if symb is not None
+        ],
+        len(start_of) * n,
+    )
+
+    pool = MatrixPool(workers) if workers is not None and workers > 1 else None
+    with pool or nullcontext():
+        if starts is not None:
+            sources = [index.node_idx[v] for v in starts if v in index.node_idx]
+            variables = _tensor_sources_fixpoint(
+                rfa_matrices,
+                box_symbols,
+                added,
+                variables,
+                start_of,
+                final_of,
+                n,
+                sources,
+                pool,
+            )
+        else:
+            variables = _tensor_fixpoint(
+                rfa_matrices, box_symbols, added, variables, start_of, final_of, n, pool
+            )
+
+    if starts is not None or finals is not None:
+        keep_rows, keep_cols = _selection(index, starts), _selection(index, finals)
+        variables = [keep_rows @ matrix @ keep_cols for matrix in variables]
+    facts = FactStore.from_matrices(
+        nodes, {Variable(name): m for name, m in zip(head_names, variables)}
+    )
+    return facts if store else facts.to_set()
 
 
 def apply_matrix_text(cfg: str, graph: nx.MultiDiGraph) -> Set[Tuple]:
@@ -167,4 +767,4 @@ def apply_matrix_text_dot(cfg: str, dot_path: str) -> Set[Tuple]:
     """
     Apply matrix algorithm to a graph
     """
-    return apply_matrix_alg(CFG.from_text(cfg), nx.nx_pydot.read_dot(dot_path))
+    return apply_matrix_alg(CFG.from_text(cfg), read_edge_list(dot_path))
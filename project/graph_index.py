@@ -0,0 +1,280 @@
+import json
+import os
+import re
+from itertools import islice
+from typing import Any, Dict, List, Tuple
+
+import networkx as nx
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+class GraphIndex:
+    """
+    Labeled graph prepared for querying: nodes are numbered 0..n-1 in
+    `nodes` order and every label has its own boolean CSR adjacency matrix.
+    Build it once per graph and pass it to the query functions instead of
+    :class:`nx.MultiDiGraph`.
+    """
+
+    def __init__(
+        self,
+        nodes: List[Any],
+        adjacency: Dict[Any, csr_matrix],
+        label_counts: Dict[Any, int] = None,
+    ):
+        self.nodes = nodes
+        self.adjacency = adjacency
+        self.label_counts = label_counts or {
+            label: matrix.nnz for label, matrix in adjacency.items()
+        }
+        self._node_idx = None
+        self._transposed = None
+
+    @staticmethod
+    def from_graph(graph: nx.MultiDiGraph) -> "GraphIndex":
+        nodes = list(graph.nodes)
+        node_idx = {v: i for i, v in enumerate(nodes)}
+        coords = dict()
+        for u, v, label in graph.edges.data(data="label"):
+            rows, cols = coords.setdefault(label, ([], []))
+            rows.append(node_idx[u])
+            cols.append(node_idx[v])
+        n = len(nodes)
+        adjacency = {
+            label: csr_matrix(
+                (np.ones(len(rows), dtype=np.bool_), (rows, cols)),
+                shape=(n, n),
+                dtype=np.bool_,
+            )
+            for label, (rows, cols) in coords.items()
+        }
+        label_counts = {label: len(rows) for label, (rows, _) in coords.items()}
+        return GraphIndex(nodes, adjacency, label_counts)
+
+    @property
+    def node_idx(self) -> Dict[Any, int]:
+        """Node to number mapping, built on first use"""
+        if self._node_idx is None:
+            self._node_idx = {v: i for i, v in enumerate(self.nodes)}
+        return self._node_idx
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.nodes)
+
+    @property
+    def n_edges(self) -> int:
+        return sum(self.label_counts.values())
+
+    @property
+    def labels(self) -> List[Any]:
+        return list(self.adjacency.keys())
+
+    @property
+    def transposed(self) -> Dict[Any, csr_matrix]:
+        """Per label adjacency of the reversed graph, built on first use"""
+        if self._transposed is None:
+            self._transposed = {
+                label: matrix.transpose().tocsr()
+                for label, matrix in self.adjacency.items()
+            }
+        return self._transposed
+
+
+def as_graph_index(graph) -> GraphIndex:
+    """Return `graph` itself if it is already indexed, otherwise index it"""
+    if isinstance(graph, GraphIndex):
+        return graph
+    return GraphIndex.from_graph(graph)
+
+
+def csr_row_entries(
+    matrix: csr_matrix, rows: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Positions in `rows` and column numbers of all entries of `rows`"""
+    begins = matrix.indptr[rows]
+    counts = matrix.indptr[rows + 1] - begins
+    owner = np.repeat(np.arange(len(rows)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owner, matrix.indices[begins[owner] + offsets]
+
+
+def save_graph_index(index: GraphIndex, path: str):
+    """
+    Save graph index into directory `path`:
+    `meta.json` with labels and counts, the node table as `nodes.npy`
+    (numeric nodes) or `nodes.json`, and `<i>.indptr.npy`, `<i>.indices.npy`
+    CSR arrays for the i-th label.
+    """
+    os.makedirs(path, exist_ok=True)
+    nodes = np.asarray(index.nodes)
+    if nodes.dtype.kind in "iu":
+        np.save(os.path.join(path, "nodes.npy"), nodes)
+    else:
+        with open(os.path.join(path, "nodes.json"), "w") as file:
+            json.dump(list(index.nodes), file)
+
+    labels = index.labels
+    for i, label in enumerate(labels):
+        matrix = index.adjacency[label]
+        np.save(os.path.join(path, f"{i}.indptr.npy"), matrix.indptr)
+        np.save(os.path.join(path, f"{i}.indices.npy"), matrix.indices)
+
+    with open(os.path.join(path, "meta.json"), "w") as file:
+        json.dump(
+            {
+                "n_nodes": index.n_nodes,
+                "labels": labels,
+                "label_counts": [index.label_counts[label] for label in labels],
+            },
+            file,
+        )
+
+
+def load_graph_index(path: str, mmap: bool = True) -> GraphIndex:
+    """
+    Open graph index saved by :func:`save_graph_index`.
+    With `mmap` the node table and CSR index arrays are memory-mapped,
+    only a boolean `data` array of ones is allocated per label.
+    """
+    mmap_mode = "r" if mmap else None
+    with open(os.path.join(path, "meta.json")) as file:
+        meta = json.load(file)
+
+    nodes_path = os.path.join(path, "nodes.npy")
+    if os.path.exists(nodes_path):
+        nodes = np.load(nodes_path, mmap_mode=mmap_mode)
+    else:
+        with open(os.path.join(path, "nodes.json")) as file:
+            nodes = json.load(file)
+
+    n = meta["n_nodes"]
+    adjacency = dict()
+    for i, label in enumerate(meta["labels"]):
+        indptr = np.load(os.path.join(path, f"{i}.indptr.npy"), mmap_mode=mmap_mode)
+        indices = np.load(os.path.join(path, f"{i}.indices.npy"), mmap_mode=mmap_mode)
+        data = np.ones(len(indices), dtype=np.bool_)
+        adjacency[label] = csr_matrix((data, indices, indptr), shape=(n, n), copy=False)
+    label_counts = dict(zip(meta["labels"], meta["label_counts"]))
+    return GraphIndex(nodes, adjacency, label_counts)
+
+
+_DOT_ID = r'("[^"]*"|[^\s;\[\]{}="]+)'
+_DOT_EDGE = re.compile(rf"^\s*{_DOT_ID}\s*->\s*{_DOT_ID}\s*(\[(.*)\])?\s*;?\s*$")
+_DOT_NODE = re.compile(rf"^\s*{_DOT_ID}\s*(\[.*\])?\s*;?\s*$")
+_DOT_LABEL = re.compile(r'(?:^|[\s,])label\s*=\s*("[^"]*"|[^\s,\]]+)')
+_DOT_KEYWORDS = {"graph", "digraph", "strict", "node", "edge", "subgraph"}
+
+
+def _unquote(text: str) -> str:
+    return text[1:-1] if len(text) >= 2 and text[0] == text[-1] == '"' else text
+
+
+def _parse_csv_line(line: str) -> Tuple:
+    parts = line.split()
+    if len(parts) != 3:
+        return None
+    u, v, label = parts
+    return (
+        int(u) if u.lstrip("-").isdigit() else u,
+        int(v) if v.lstrip("-").isdigit() else v,
+        label,
+    )
+
+
+def _parse_dot_line(line: str) -> Tuple:
+    """
+    Parse one line of the DOT subset written by :func:`save_graph`:
+    `u -> v [label=x];` edges and `u;` node statements, one per line
+    """
+    match = _DOT_EDGE.match(line)
+    if match:
+        label = _DOT_LABEL.search(match.group(4) or "")
+        return (
+            _unquote(match.group(1)),
+            _unquote(match.group(2)),
+            _unquote(label.group(1)) if label else None,
+        )
+    match = _DOT_NODE.match(line)
+    if match and match.group(1) not in _DOT_KEYWORDS:
+        return _unquote(match.group(1)), None, None
+    return None
+
+
+def read_edge_list(path: str, chunk_size: int = 1 << 16) -> GraphIndex:
+    """
+    Stream graph from CSV edge list (`from to label` lines, the cfpq_data
+    format) or from the DOT subset written by :func:`save_graph`.
+    Lines are read `chunk_size` at a time, node names and labels are
+    interned on the fly and only integer arrays are kept between chunks.
+    Node and per label edge counts are collected in the same pass.
+    """
+    parse = _parse_dot_line if path.endswith((".dot", ".gv")) else _parse_csv_line
+    node_ids = dict()
+    label_ids = dict()
+    rows, cols = [], []
+    label_counts = []
+
+    def intern(node) -> int:
+        i = node_ids.get(node)
+        if i is None:
+            i = node_ids[node] = len(node_ids)
+        return i
+
+    with open(path) as file:
+        while True:
+            lines = list(islice(file, chunk_size))
+            if not lines:
+                break
+            src, dst, lab = [], [], []
+            for line in lines:
+                parsed = parse(line)
+                if parsed is None:
+                    continue
+                u, v, label = parsed
+                if v is None:
+                    intern(u)
+                    continue
+                src.append(intern(u))
+                dst.append(intern(v))
+                j = label_ids.get(label)
+                if j is None:
+                    j = label_ids[label] = len(label_ids)
+                    rows.append([])
+                    cols.append([])
+                    label_counts.append(0)
+                lab.append(j)
+
+            src = np.array(src, dtype=np.int64)
+            dst = np.array(dst, dtype=np.int64)
+            lab = np.array(lab, dtype=np.int64)
+            for j in np.unique(lab):
+                mask = lab == j
+                rows[j].append(src[mask])
+                cols[j].append(dst[mask])
+                label_counts[j] += int(mask.sum())
+
+    n = len(node_ids)
+    adjacency = dict()
+    for label, j in label_ids.items():
+        r, c = np.concatenate(rows[j]), np.concatenate(cols[j])
+        rows[j] = cols[j] = None
+        adjacency[label] = csr_matrix(
+            (np.ones(len(r), dtype=np.bool_), (r, c)), shape=(n, n), dtype=np.bool_
+        )
+    return GraphIndex(
+        list(node_ids.keys()),
+        adjacency,
+        {label: label_counts[j] for label, j in label_ids.items()},
+    )
+
+
+def convert_graph(src: str, dst: str) -> GraphIndex:
+    """
+    Convert graph from CSV edge list or DOT file (see :func:`read_edge_list`)
+    into the binary format in directory `dst`
+    """
+    index = read_edge_list(src)
+    save_graph_index(index, dst)
+    return index
@@ -0,0 +1,173 @@
+from collections import deque
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+import networkx as nx
+from pyformlang.cfg import CFG, Variable
+from scipy.sparse import block_diag
+
+from project.cfg import compile_grammar
+from project.dfa_utils import BFSBasedRPQ_fronts, compile_regex
+from project.graph import HellingsWorklist
+from project.graph_index import GraphIndex, as_graph_index
+
+
+class IncrementalCFPQ:
+    """
+    Context-free path query kept up to date under edge insertions.
+    New edges only seed Hellings' worklist with their own facts, so an
+    insertion costs as much as the part of the closure it changes.
+    """
+
+    def __init__(
+        self,
+        cfg: CFG,
+        graph: nx.MultiDiGraph | GraphIndex,
+        S: Variable = Variable("S"),
+    ):
+        self.S = S
+        self.worklist = HellingsWorklist(compile_grammar(cfg))
+        self.nodes = set()
+        index = as_graph_index(graph)
+        self._insert(
+            (index.nodes[i], label, index.nodes[j])
+            for label, matrix in index.adjacency.items()
+            for i, j in zip(*matrix.nonzero())
+        )
+        for node in index.nodes:
+            self._add_node(node)
+        self.worklist.run()
+
+    @property
+    def pairs(self) -> Set[Tuple]:
+        """All pairs of nodes connected by a path derivable from `S`"""
+        return self.worklist.pairs(self.S)
+
+    def add_edges(self, edges: Iterable[Tuple[Any, Any, Any]]) -> Set[Tuple]:
+        """Insert `(u, label, v)` edges, return pairs that became reachable"""
+        self._insert(edges)
+        return {(u, v) for u, var, v in self.worklist.run() if var == self.S}
+
+    def _add_node(self, node):
+        if node not in self.nodes:
+            self.nodes.add(node)
+            self.worklist.add_node(node)
+
+    def _insert(self, edges: Iterable[Tuple[Any, Any, Any]]):
+        for u, label, v in edges:
+            self._add_node(u)
+            self._add_node(v)
+            self.worklist.add_edge(u, label, v)
+
+
+class IncrementalRPQ:
+    """
+    Regular path query kept up to date under edge insertions.
+    For every source the visited (DFA state, node) pairs of its BFS are
+    kept; a new edge extends only the fronts of the sources that have
+    already reached its tail in a matching DFA state.
+    If `starts` is omitted every node, including nodes added later,
+    is a source.
+    """
+
+    def __init__(
+        self,
+        regex: str,
+        graph: nx.MultiDiGraph | GraphIndex,
+        starts: Iterable = None,
+    ):
+        compiled = compile_regex(regex)
+        dfa, state_idx = compiled.dfa, compiled.state_idx
+        self.start_state = (
+            state_idx[dfa.start_state] if dfa.start_state is not None else None
+        )
+        self.final_states = {state_idx[s] for s in dfa.final_states}
+        self.delta: Dict[Tuple[int, Any], int] = dict()
+        self.by_label: Dict[Any, List[Tuple[int, int]]] = dict()
+        for fro, symb, to in dfa:
+            self.delta[(state_idx[fro], symb.value)] = state_idx[to]
+            self.by_label.setdefault(symb.value, []).append(
+                (state_idx[fro], state_idx[to])
+            )
+        self.all_sources = starts is None
+
+        index = as_graph_index(graph)
+        self.out: Dict[Any, Set[Tuple[Any, Any]]] = dict()
+        for label, matrix in index.adjacency.items():
+            for i, j in zip(*matrix.nonzero()):
+                self._add_out(index.nodes[i], label, index.nodes[j])
+
+        sources = list(index.nodes) if starts is None else list(dict.fromkeys(starts))
+        self.visited: Dict[Any, Set[Tuple[int, Any]]] = {u: set() for u in sources}
+        self.reached_by: Dict[Tuple[int, Any], Set[Any]] = dict()
+        self._initial_bfs(compiled, index, sources)
+
+    @property
+    def pairs(self) -> Set[Tuple]:
+        """All pairs (source, node) connected by a path matching the regex"""
+        return {
+            (u, x)
+            for u, states in self.visited.items()
+            for q, x in states
+            if q in self.final_states
+        }
+
+    def add_edges(self, edges: Iterable[Tuple[Any, Any, Any]]) -> Set[Tuple]:
+        """Insert `(u, label, v)` edges, return pairs that became reachable"""
+        edges = list(edges)
+        front = deque()
+        found = set()
+        for u, label, v in edges:
+            self._add_out(u, label, v)
+            for node in (u, v):
+                if self.all_sources and node not in self.visited:
+                    self.visited[node] = set()
+                    self._visit(node, self.start_state, node, front, found)
+        for u, label, v in edges:
+            for q, q_next in self.by_label.get(label, ()):
+                for source in list(self.reached_by.get((q, u), ())):
+                    self._visit(source, q_next, v, front, found)
+        self._propagate(front, found)
+        return found
+
+    def _add_out(self, u, label, v):
+        self.out.setdefault(u, set()).add((label, v))
+        self.out.setdefault(v, set())
+
+    def _visit(self, source, q: int, node, front: deque, found: Set):
+        if q is None or (q, node) in self.visited[source]:
+            return
+        self.visited[source].add((q, node))
+        self.reached_by.setdefault((q, node), set()).add(source)
+        front.append((source, q, node))
+        if q in self.final_states:
+            found.add((source, node))
+
+    def _propagate(self, front: deque, found: Set):
+        while front:
+            source, q, node = front.popleft()
+            for label, v in self.out.get(node, ()):
+                q_next = self.delta.get((q, label))
+                if q_next is not None:
+                    self._visit(source, q_next, v, front, found)
+
+    def _initial_bfs(self, compiled, index: GraphIndex, sources):
+        if self.start_state is None or not sources:
+            return
+        common = set(compiled.matrices.keys()).intersection(index.adjacency.keys())
+        transitions = {
+            s: block_diag((compiled.matrices[s], index.adjacency[s]), format="csr")
+            for s in common
+        }
+        visited = BFSBasedRPQ_fronts(
+            compiled.dfa,
+            compiled.state_idx,
+            index.n_nodes,
+            transitions,
+            [[index.node_idx[u]] for u in sources],
+        )
+        n_regex = len(compiled.state_idx)
+        rows, cols = visited.nonzero()
+        for row, col in zip(rows, cols):
+            source, q, node = sources[row // n_regex], row % n_regex, index.nodes[col]
+            self.visited[source].add((q, node))
+            self.reached_by.setdefault((q, node), set()).add(source)
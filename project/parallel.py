@@ -0,0 +1,162 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix, vstack
+
+from project.bitmatrix import WORD, BitMatrix, bool_matmul, is_packed
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """
+    Open existing block. Workers share the resource tracker of the pool
+    owner, which already tracks the block, so it is not registered again
+    where the Python version allows that
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _view(shm: shared_memory.SharedMemory, dtype: str, length: int) -> np.ndarray:
+    return np.ndarray((length,), dtype=dtype, buffer=shm.buf)
+
+
+def _open_matrix(descriptor: Tuple, handles: List):
+    """Rebuild a published matrix on top of the shared blocks"""
+    kind, shape, arrays = descriptor
+    views = []
+    for name, dtype, length in arrays:
+        shm = _attach(name)
+        handles.append(shm)
+        views.append(_view(shm, dtype, length))
+    if kind == "packed":
+        n_words = (shape[1] + WORD - 1) // WORD
+        return BitMatrix(views[0].reshape(shape[0], n_words), shape[1])
+    indptr, indices = views
+    data = np.ones(len(indices), dtype=np.bool_)
+    return csr_matrix((data, indices, indptr), shape=shape, copy=False)
+
+
+def _export(matrix) -> Tuple:
+    if is_packed(matrix):
+        return "packed", matrix.shape, (matrix.words.copy(),)
+    matrix = csr_matrix(matrix)
+    return "csr", matrix.shape, (matrix.indptr.copy(), matrix.indices.copy())
+
+
+def _import(exported: Tuple):
+    kind, shape, arrays = exported
+    if kind == "packed":
+        return BitMatrix(arrays[0], shape[1])
+    indptr, indices = arrays
+    data = np.ones(len(indices), dtype=np.bool_)
+    return csr_matrix((data, indices, indptr), shape=shape)
+
+
+def _multiply_block(left: Tuple, right: Tuple, begin: int, end: int) -> Tuple:
+    """Worker: rows `begin:end` of the product of two published matrices"""
+    handles = []
+    try:
+        a = _open_matrix(left, handles)
+        b = _open_matrix(right, handles)
+        if is_packed(a):
+            rows = BitMatrix(a.words[begin:end].copy(), a.n_cols)
+        else:
+            rows = a[begin:end]
+        result = _export(bool_matmul(rows, b))
+        del a, b, rows
+        return result
+    finally:
+        for shm in handles:
+            shm.close()
+
+
+class MatrixPool:
+    """
+    Process pool for boolean matrix products.
+    Operands are copied once per call into shared memory blocks and
+    workers map them instead of receiving pickled matrices; every product
+    is split into row blocks, so independent products and the rows of a
+    single large product run on different cores.
+    """
+
+    def __init__(self, workers: int = None):
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = None
+
+    def __enter__(self) -> "MatrixPool":
+        self._executor = ProcessPoolExecutor(self.workers)
+        return self
+
+    def __exit__(self, *args):
+        self._executor.shutdown()
+        self._executor = None
+
+    def matmul(self, a, b):
+        return self.matmul_many([(a, b)])[0]
+
+    def matmul_many(self, pairs: List[Tuple]) -> List:
+        """Products of all `(a, b)` pairs, in order"""
+        published: Dict[int, Tuple] = dict()
+        blocks = []
+        try:
+            for a, b in pairs:
+                for matrix in (a, b):
+                    if id(matrix) not in published:
+                        published[id(matrix)] = self._publish(matrix, blocks)
+
+            n_blocks = max(1, -(-self.workers // max(1, len(pairs))))
+            futures = []
+            for a, b in pairs:
+                n_rows = a.shape[0]
+                step = max(1, -(-n_rows // n_blocks))
+                futures.append(
+                    [
+                        self._executor.submit(
+                            _multiply_block,
+                            published[id(a)],
+                            published[id(b)],
+                            begin,
+                            min(n_rows, begin + step),
+                        )
+                        for begin in range(0, n_rows, step)
+                    ]
+                )
+            return [
+                self._join([_import(f.result()) for f in parts], a.shape[0], b.shape[1])
+                for parts, (a, b) in zip(futures, pairs)
+            ]
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+
+    @staticmethod
+    def _publish(matrix, blocks: List) -> Tuple:
+        if is_packed(matrix):
+            kind, arrays = "packed", (matrix.words,)
+        else:
+            matrix = csr_matrix(matrix)
+            kind, arrays = "csr", (matrix.indptr, matrix.indices)
+        described = []
+        for array in arrays:
+            array = np.ascontiguousarray(array)
+            shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+            blocks.append(shm)
+            view = _view(shm, array.dtype.str, array.size)
+            view[:] = array.ravel()
+            del view
+            described.append((shm.name, array.dtype.str, array.size))
+        return kind, matrix.shape, tuple(described)
+
+    @staticmethod
+    def _join(parts: List, n_rows: int, n_cols: int):
+        if not parts:
+            return csr_matrix((n_rows, n_cols), dtype=np.bool_)
+        if is_packed(parts[0]):
+            return BitMatrix(np.vstack([p.words for p in parts]), n_cols)
+        return vstack(parts, format="csr")
@@ -0,0 +1,399 @@
+import heapq
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+import networkx as nx
+import numpy as np
+from pyformlang.cfg import CFG, Variable
+
+from project.cfg import compile_grammar
+from project.dfa_utils import compile_regex
+from project.graph_index import GraphIndex, as_graph_index, csr_row_entries
+
+_EPSILON = 0
+_TERMINAL = 1
+_BINARY = 2
+# heap entries are `length << _ID_BITS | fact_id`
+_ID_BITS = 40
+
+
+class _FactIndex:
+    """
+    Hash table from non-negative fact keys to fact ids: open addressing with
+    linear probing over two `array`s, 16 bytes per slot and at most half of
+    the slots used, instead of the Python objects of a dict
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        self.mask = capacity - 1
+        self.keys = array("q", [-1]) * capacity
+        self.ids = array("q", [0]) * capacity
+
+    def _slot(self, key: int) -> int:
+        slot = (key * 0x9E3779B97F4A7C15 >> 24) & self.mask
+        keys = self.keys
+        while keys[slot] != key and keys[slot] != -1:
+            slot = (slot + 1) & self.mask
+        return slot
+
+    def get(self, key: int) -> int:
+        """Id of the key, -1 if it is missing"""
+        slot = self._slot(key)
+        return self.ids[slot] if self.keys[slot] == key else -1
+
+    def put(self, key: int, fact_id: int):
+        """Add a key that is not in the table"""
+        if 2 * (self.size + 1) > len(self.keys):
+            keys, ids = self.keys, self.ids
+            self._allocate(2 * len(keys))
+            for old_key, old_id in zip(keys, ids):
+                if old_key != -1:
+                    slot = self._slot(old_key)
+                    self.keys[slot], self.ids[slot] = old_key, old_id
+        slot = self._slot(key)
+        self.keys[slot], self.ids[slot] = key, fact_id
+        self.size += 1
+
+
+class CFPQProvenance:
+    """
+    Hellings' facts derived in order of the length of their shortest path
+    (Knuth's generalisation of Dijkstra's algorithm), so the first
+    derivation found for every fact is a shortest one.
+    Facts are keyed by `(var * n + u) * n + v`. After the derivation the
+    keys are kept as a sorted `int64` array with the fact ids in the same
+    order, so lookups are binary searches. Every fact also has a length
+    and one back-pointer (split node and production index) in flat arrays:
+    36 bytes per fact in total, 24 with `lengths_only`, where paths cannot
+    be extracted.
+    While deriving, facts are found through a :class:`_FactIndex` (16 to 32
+    bytes per fact), joined through per node `array`s of fact ids (16 bytes)
+    and ordered by a heap of pending `int` entries, so the peak stays within
+    90-150 bytes per fact, depending on how full the index is. The index,
+    arrays and heap are dropped at the end.
+    """
+
+    def __init__(
+        self,
+        cfg: CFG,
+        graph: nx.MultiDiGraph | GraphIndex,
+        S: Variable = Variable("S"),
+        lengths_only: bool = False,
+    ):
+        self.S = S
+        self.lengths_only = lengths_only
+        self.index = as_graph_index(graph)
+        grammar = compile_grammar(cfg)
+        self.variables = sorted(grammar.wcnf.variables, key=str)
+        var_idx = {var: i for i, var in enumerate(self.variables)}
+
+        self.rules: List[Tuple] = [
+            (_EPSILON, var_idx[head]) for head in grammar.epsilon_heads
+        ]
+        epsilon_rules = range(len(self.rules))
+        terminal_rules = dict()
+        for label, heads in grammar.terminal_heads.items():
+            for head in heads:
+                terminal_rules.setdefault(label, []).append(len(self.rules))
+                self.rules.append((_TERMINAL, var_idx[head], label))
+        binary_rules = dict()
+        for (left, right), heads in grammar.binary_heads.items():
+            key = (var_idx[left], var_idx[right])
+            for head in heads:
+                binary_rules.setdefault(key, []).append(len(self.rules))
+                self.rules.append((_BINARY, var_idx[head], *key))
+
+        self.length = array("q")
+        self.split = array("q")
+        self.rule = array("i")
+        keys = self._derive(epsilon_rules, terminal_rules, binary_rules)
+        self.ids = np.argsort(keys, kind="stable")
+        self.keys = keys[self.ids]
+        self._s_idx = var_idx.get(S)
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the key, id, back-pointer and length arrays"""
+        arrays = (self.length, self.split, self.rule)
+        return (
+            sum(a.itemsize * len(a) for a in arrays)
+            + self.keys.nbytes
+            + self.ids.nbytes
+        )
+
+    @property
+    def facts(self) -> Set[Tuple]:
+        """Same facts as :func:`project.graph.hellings_cfpq`"""
+        nodes = self.index.nodes
+        return {
+            (nodes[u], self.variables[var], nodes[v])
+            for var, u, v in zip(*(a.tolist() for a in self._decode(self.keys)))
+        }
+
+    @property
+    def pairs(self) -> Set[Tuple]:
+        nodes = self.index.nodes
+        var, u, v = self._decode(self.keys)
+        mask = var == self._s_idx
+        return {(nodes[x], nodes[y]) for x, y in zip(u[mask], v[mask])}
+
+    def path_length(self, u, v) -> Optional[int]:
+        """Length of the shortest path from `u` to `v` derivable from `S`"""
+        fact_id = self._fact_id(u, v)
+        return None if fact_id is None else self.length[fact_id]
+
+    def extract_path(self, u, v) -> Optional[List[Tuple]]:
+        """
+        Shortest path from `u` to `v` derivable from `S` as a list of
+        `(from, label, to)` edges, `None` if there is no such path
+        """
+        if self.lengths_only:
+            raise ValueError("provenance was built with lengths_only=True")
+        fact_id = self._fact_id(u, v)
+        if fact_id is None:
+            return None
+        nodes = self.index.nodes
+        path = []
+        stack = [(self.index.node_idx[u], fact_id, self.index.node_idx[v])]
+        while stack:
+            x, fact_id, y = stack.pop()
+            rule = self.rules[self.rule[fact_id]]
+            if rule[0] == _TERMINAL:
+                path.append((nodes[x], rule[2], nodes[y]))
+            elif rule[0] == _BINARY:
+                w = self.split[fact_id]
+                stack.append((w, self._lookup(rule[3], w, y), y))
+                stack.append((x, self._lookup(rule[2], x, w), w))
+        return path
+
+    def _key(self, var: int, u: int, v: int) -> int:
+        n = self.index.n_nodes
+        return (var * n + u) * n + v
+
+    def _decode(self, keys: np.ndarray) -> Tuple[np.ndarray, ...]:
+        n = max(1, self.index.n_nodes)
+        rest, v = np.divmod(keys, n)
+        var, u = np.divmod(rest, n)
+        return var, u, v
+
+    def _lookup(self, var: int, u: int, v: int) -> Optional[int]:
+        key = self._key(var, u, v)
+        pos = np.searchsorted(self.keys, key)
+        if pos < len(self.keys) and self.keys[pos] == key:
+            return int(self.ids[pos])
+        return None
+
+    def _fact_id(self, u, v) -> Optional[int]:
+        node_idx = self.index.node_idx
+        if self._s_idx is None or u not in node_idx or v not in node_idx:
+            return None
+        return self._lookup(self._s_idx, node_idx[u], node_idx[v])
+
+    def _derive(
+        self, epsilon_rules: range, terminal_rules: Dict, binary_rules: Dict
+    ) -> np.ndarray:
+        """Fill the length and back-pointer arrays, return keys by fact id"""
+        n = self.index.n_nodes
+        fact_ids = _FactIndex()
+        keys = array("q")
+        heap = []
+        done = bytearray()
+
+        def relax(var: int, u: int, v: int, length: int, split: int, rule: int):
+            key = (var * n + u) * n + v
+            fact_id = fact_ids.get(key)
+            if fact_id < 0:
+                fact_id = len(self.length)
+                fact_ids.put(key, fact_id)
+                keys.append(key)
+                self.length.append(length)
+                if not self.lengths_only:
+                    self.split.append(split)
+                    self.rule.append(rule)
+                done.append(0)
+            elif done[fact_id] or self.length[fact_id] <= length:
+                return
+            else:
+                self.length[fact_id] = length
+                if not self.lengths_only:
+                    self.split[fact_id] = split
+                    self.rule[fact_id] = rule
+            heapq.heappush(heap, length << _ID_BITS | fact_id)
+
+        for node in range(n):
+            for rule in epsilon_rules:
+                relax(self.rules[rule][1], node, node, 0, -1, rule)
+        for label, matrix in self.index.adjacency.items():
+            rules = terminal_rules.get(label, ())
+            if not rules:
+                continue
+            for i, j in zip(*matrix.nonzero()):
+                for rule in rules:
+                    relax(self.rules[rule][1], int(i), int(j), 1, -1, rule)
+
+        # done facts by their source and target node, as fact ids
+        by_source = [array("q") for _ in range(n)]
+        by_target = [array("q") for _ in range(n)]
+        while heap:
+            length, fact_id = divmod(heapq.heappop(heap), 1 << _ID_BITS)
+            if done[fact_id] or length != self.length[fact_id]:
+                continue
+            done[fact_id] = 1
+            rest, v = divmod(keys[fact_id], n)
+            var, u = divmod(rest, n)
+            by_source[u].append(fact_id)
+            by_target[v].append(fact_id)
+            for other in by_target[u]:
+                rest, _ = divmod(keys[other], n)
+                var1, uu = divmod(rest, n)
+                length1 = self.length[other]
+                for rule in binary_rules.get((var1, var), ()):
+                    relax(self.rules[rule][1], uu, v, length1 + length, u, rule)
+            for other in by_source[v]:
+                rest, vv = divmod(keys[other], n)
+                var1 = rest // n
+                length1 = self.length[other]
+                for rule in binary_rules.get((var, var1), ()):
+                    relax(self.rules[rule][1], u, vv, length + length1, v, rule)
+        return np.frombuffer(keys, dtype=np.int64).copy()
+
+
+class RPQProvenance:
+    """
+    Shortest witnesses of a regular path query.
+    The BFS over (DFA state, node) pairs of a source is run on the first
+    request for it; every reached pair keeps its distance and, unless
+    `lengths_only` is set, the predecessor pair and the edge label used.
+    At most `max_sources` searches are kept, least recently used ones are
+    dropped and recomputed on demand.
+    """
+
+    def __init__(
+        self,
+        regex: str,
+        graph: nx.MultiDiGraph | GraphIndex,
+        lengths_only: bool = False,
+        max_sources: int = 64,
+    ):
+        self.lengths_only = lengths_only
+        self.max_sources = max_sources
+        self.index = as_graph_index(graph)
+        automaton = compile_regex(regex).automaton
+        self.n_states = automaton.n_states
+        self.start_states = automaton.start_states
+        self.final_states = automaton.final_states
+
+        self.labels = []
+        self.steps = []
+        for symb, matrix in automaton.matrices.items():
+            if symb not in self.index.adjacency:
+                continue
+            delta = np.full(self.n_states, -1, dtype=np.int64)
+            fro, to = matrix.nonzero()
+            delta[fro] = to
+            self.labels.append(symb.value if hasattr(symb, "value") else symb)
+            self.steps.append((delta, self.index.adjacency[symb]))
+        self._searches = OrderedDict()
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the arrays of all searches kept"""
+        return sum(
+            array.nbytes
+            for search in self._searches.values()
+            for array in search
+            if array is not None
+        )
+
+    def reachable(self, u) -> Set:
+        """Nodes reachable from `u` by a path matching the regex"""
+        distance = self._search(u)[0]
+        n = self.index.n_nodes
+        mask = np.zeros(n, dtype=np.bool_)
+        for f in self.final_states:
+            mask |= distance[f * n : (f + 1) * n] >= 0
+        return {self.index.nodes[i] for i in np.flatnonzero(mask)}
+
+    def path_length(self, u, v) -> Optional[int]:
+        """Length of the shortest path from `u` to `v` matching the regex"""
+        end = self._end(u, v)
+        return None if end is None else int(self._search(u)[0][end])
+
+    def extract_path(self, u, v) -> Optional[List[Tuple]]:
+        """
+        Shortest path from `u` to `v` matching the regex as a list of
+        `(from, label, to)` edges, `None` if there is no such path
+        """
+        if self.lengths_only:
+            raise ValueError("provenance was built with lengths_only=True")
+        end = self._end(u, v)
+        if end is None:
+            return None
+        _, predecessor, label = self._search(u)
+        n, nodes = self.index.n_nodes, self.index.nodes
+        path = []
+        while predecessor[end] >= 0:
+            before = predecessor[end]
+            path.append((nodes[before % n], self.labels[label[end]], nodes[end % n]))
+            end = before
+        path.reverse()
+        return path
+
+    def _end(self, u, v) -> Optional[int]:
+        """Final product pair of a shortest path from `u` to `v`"""
+        node_idx = self.index.node_idx
+        if u not in node_idx or v not in node_idx:
+            return None
+        distance = self._search(u)[0]
+        ends = self.final_states * self.index.n_nodes + node_idx[v]
+        ends = ends[distance[ends] >= 0]
+        if len(ends) == 0:
+            return None
+        return int(ends[np.argmin(distance[ends])])
+
+    def _search(self, u) -> Tuple:
+        if u in self._searches:
+            self._searches.move_to_end(u)
+            return self._searches[u]
+        search = self._bfs(self.index.node_idx[u])
+        self._searches[u] = search
+        if len(self._searches) > self.max_sources:
+            self._searches.popitem(last=False)
+        return search
+
+    def _bfs(self, source: int) -> Tuple:
+        n = self.index.n_nodes
+        size = self.n_states * n
+        distance = np.full(size, -1, dtype=np.int32)
+        predecessor = label = None
+        if not self.lengths_only:
+            predecessor = np.full(size, -1, dtype=np.int64)
+            label = np.full(size, -1, dtype=np.int32)
+
+        front = np.unique(self.start_states * n + source)
+        distance[front] = 0
+        level = 0
+        while len(front) and self.steps:
+            level += 1
+            states, nodes = np.divmod(front, n)
+            found, before, used = [], [], []
+            for j, (delta, matrix) in enumerate(self.steps):
+                moved = delta[states]
+                ok = moved >= 0
+                owner, targets = csr_row_entries(matrix, nodes[ok])
+                found.append(moved[ok][owner] * n + targets)
+                before.append(front[ok][owner])
+                used.append(np.full(len(targets), j, dtype=np.int32))
+            found = np.concatenate(found)
+            fresh = distance[found] < 0
+            front, first = np.unique(found[fresh], return_index=True)
+            distance[front] = level
+            if not self.lengths_only:
+                predecessor[front] = np.concatenate(before)[fresh][first]
+                label[front] = np.concatenate(used)[fresh][first]
+        return distance, predecessor, label
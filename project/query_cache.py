@@ -0,0 +1,87 @@
+import hashlib
+import os
+import pickle
+from collections import OrderedDict, namedtuple
+from typing import Any, Callable
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+class QueryCache:
+    """
+    LRU cache of compiled queries
+
+    Keys are normalised query texts, values are whatever the compile
+    function returns. If `directory` is given, every compiled value is also
+    pickled there, so a fresh process finds it without recompiling.
+    """
+
+    def __init__(self, maxsize: int = 256, directory: str = None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, key: str, compile: Callable[[], Any]) -> Any:
+        """Return cached value for `key`, calling `compile` on a miss"""
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        value = self._load(key)
+        if value is None:
+            self.misses += 1
+            value = compile()
+            self._store(key, value)
+        else:
+            self.hits += 1
+
+        self._entries[key] = value
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return value
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+    def clear(self):
+        """Drop in-memory entries and counters, files on disk are kept"""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.pickle")
+
+    def _load(self, key: str) -> Any:
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(key), "rb") as file:
+                stored_key, value = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        return value if stored_key == key else None
+
+    def _store(self, key: str, value: Any):
+        if self.directory is None:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            pickle.dump((key, value), file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+
+default_cache = QueryCache()
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace in every line and drop empty lines"""
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
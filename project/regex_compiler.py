@@ -0,0 +1,312 @@
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+_SPECIAL = set(".|+*$()")
+_UNION = {"|", "+"}
+_EPSILON = {"$", "epsilon"}
+# (nullable, first, last) of the empty language
+_EMPTY = (False, 0, 0)
+
+
+class RegexSyntaxError(ValueError):
+    pass
+
+
+def _tokenize(expr: str) -> List[str]:
+    """
+    Split regex into components the way pyformlang does: every special
+    character is a component of its own, other characters form symbols
+    ended by whitespace or a special character, a backslash escapes the
+    next character
+    """
+    tokens = []
+    current = []
+    escaped = False
+    for c in expr:
+        if escaped:
+            current.append(c)
+            escaped = False
+        elif c == "\\":
+            current.append(c)
+            escaped = True
+        elif c.isspace() or c in _SPECIAL:
+            if current:
+                tokens.append("".join(current))
+                current = []
+            if c in _SPECIAL:
+                tokens.append(c)
+        else:
+            current.append(c)
+    if current:
+        tokens.append("".join(current))
+    return tokens
+
+
+class _Parser:
+    """
+    Recursive descent parser building the position automaton on the fly.
+    Every parsed subexpression is `(nullable, first, last)` with position
+    sets as integer bitsets; `follow` is filled while parsing.
+    Precedence: star, then concatenation (`.` or juxtaposition), then union
+    (`|` or `+`). A missing operand denotes the empty language.
+    """
+
+    def __init__(self, tokens: List[str]):
+        self.tokens = tokens
+        self.pos = 0
+        self.labels: List[str] = []
+        self.follow: List[int] = []
+
+    def peek(self) -> str:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def parse(self) -> Tuple[bool, int, int]:
+        result = self.union()
+        if self.peek() is not None:
+            raise RegexSyntaxError(f"unexpected {self.peek()!r}")
+        return result
+
+    def union(self) -> Tuple[bool, int, int]:
+        nullable, first, last = self.concat()
+        while self.peek() in _UNION:
+            self.pos += 1
+            n2, f2, l2 = self.concat()
+            nullable, first, last = nullable or n2, first | f2, last | l2
+        return nullable, first, last
+
+    def concat(self) -> Tuple[bool, int, int]:
+        result = None
+        expects_operand = False
+        while True:
+            token = self.peek()
+            if token == ".":
+                self.pos += 1
+                result = self.concatenate(result, None)
+                expects_operand = True
+                continue
+            if token is None or token in _UNION or token == ")":
+                break
+            result = self.concatenate(result, self.star())
+            expects_operand = False
+        if expects_operand or result is None:
+            # a missing operand is the empty language
+            result = self.concatenate(result, _EMPTY)
+        return result
+
+    def concatenate(self, left, right) -> Tuple[bool, int, int]:
+        if right is None:
+            return _EMPTY if left is None else left
+        if left is None:
+            return right
+        n1, f1, l1 = left
+        n2, f2, l2 = right
+        self.link(l1, f2)
+        return n1 and n2, f1 | f2 if n1 else f1, l2 | l1 if n2 else l2
+
+    def star(self) -> Tuple[bool, int, int]:
+        nullable, first, last = self.atom()
+        while self.peek() == "*":
+            self.pos += 1
+            self.link(last, first)
+            nullable = True
+        return nullable, first, last
+
+    def atom(self) -> Tuple[bool, int, int]:
+        token = self.peek()
+        self.pos += 1
+        if token == "(":
+            result = self.union()
+            if self.peek() != ")":
+                raise RegexSyntaxError("unbalanced parenthesis")
+            self.pos += 1
+            return result
+        if token in _EPSILON:
+            return True, 0, 0
+        if token in ("*", ")"):
+            raise RegexSyntaxError(f"unexpected {token!r}")
+        position = len(self.labels)
+        self.labels.append(token[1:] if token.startswith("\\") else token)
+        self.follow.append(0)
+        return False, 1 << position, 1 << position
+
+    def link(self, last: int, first: int):
+        while last:
+            low = last & -last
+            self.follow[low.bit_length() - 1] |= first
+            last ^= low
+
+
+@dataclass
+class MinimalDFA:
+    """
+    Minimal DFA with states 0..n_states-1, missing transitions lead to an
+    implicit dead state. Transition `i` goes from `sources[i]` to
+    `targets[i]` by `symbols[symbol_ids[i]]`.
+    """
+
+    n_states: int
+    start_state: int
+    final_states: np.ndarray
+    symbols: List[str]
+    sources: np.ndarray
+    symbol_ids: np.ndarray
+    targets: np.ndarray
+
+    def to_matrices(self) -> Dict[str, csr_matrix]:
+        """Boolean transition matrix per symbol"""
+        result = dict()
+        for i, symbol in enumerate(self.symbols):
+            mask = self.symbol_ids == i
+            result[symbol] = csr_matrix(
+                (
+                    np.ones(int(mask.sum()), dtype=np.bool_),
+                    (self.sources[mask], self.targets[mask]),
+                ),
+                shape=(self.n_states, self.n_states),
+                dtype=np.bool_,
+            )
+        return result
+
+
+def _subset_construction(parser: _Parser, first: int, nullable: bool, last: int):
+    """
+    Determinize the position automaton. A DFA state is identified by the
+    union of the follow sets of its positions and by whether it accepts:
+    subsets with equal pairs have equal futures, so they are merged here
+    already
+    """
+    labels, follow = parser.labels, parser.follow
+    symbol_ids = dict()
+    label_ids = [symbol_ids.setdefault(label, len(symbol_ids)) for label in labels]
+
+    state_ids = {(first, nullable): 0}
+    queue = [(first, nullable)]
+    finals = [nullable]
+    sources, symbols, targets = [], [], []
+    reached = dict()
+    while queue:
+        state = queue.pop()
+        source = state_ids[state]
+        by_symbol = dict()
+        rest = state[0]
+        while rest:
+            low = rest & -rest
+            position = low.bit_length() - 1
+            key = label_ids[position]
+            by_symbol[key] = by_symbol.get(key, 0) | low
+            rest ^= low
+        for symbol, positions in by_symbol.items():
+            target = reached.get(positions)
+            if target is None:
+                union = 0
+                rest = positions
+                while rest:
+                    low = rest & -rest
+                    union |= follow[low.bit_length() - 1]
+                    rest ^= low
+                target = reached[positions] = (union, positions & last != 0)
+            if target not in state_ids:
+                state_ids[target] = len(state_ids)
+                finals.append(target[1])
+                queue.append(target)
+            sources.append(source)
+            symbols.append(symbol)
+            targets.append(state_ids[target])
+    return (
+        len(state_ids),
+        np.array(finals, dtype=np.bool_),
+        list(symbol_ids),
+        np.array(sources, dtype=np.int64),
+        np.array(symbols, dtype=np.int64),
+        np.array(targets, dtype=np.int64),
+    )
+
+
+def _minimize(
+    n_states: int,
+    finals: np.ndarray,
+    sources: np.ndarray,
+    symbols: np.ndarray,
+    targets: np.ndarray,
+) -> Tuple:
+    """
+    Drop states that cannot reach a final state, then refine the
+    partition {final, non-final} until stable (Moore). In every round the
+    signature of a state is its class and the row of (symbol, target class)
+    keys of its transitions sorted by symbol; equal signatures are grouped
+    with one `np.unique` over the padded rows.
+    """
+    alive = finals.copy()
+    changed = True
+    while changed:
+        grown = alive.copy()
+        grown[sources[alive[targets]]] = True
+        changed = bool((grown != alive).any())
+        alive = grown
+    if not alive[0]:
+        empty = np.zeros(0, dtype=np.int64)
+        return 1, 0, np.zeros(1, dtype=np.bool_), empty, empty, empty
+
+    keep = alive[sources] & alive[targets]
+    sources, symbols, targets = sources[keep], symbols[keep], targets[keep]
+    order = np.lexsort((symbols, sources))
+    sources, symbols, targets = sources[order], symbols[order], targets[order]
+    degree = np.bincount(sources, minlength=n_states)
+    column = np.arange(len(sources)) - np.repeat(np.cumsum(degree) - degree, degree)
+    width = int(degree.max()) if len(degree) else 0
+
+    classes = np.where(alive, finals.astype(np.int64), -1)
+    n_classes = len(np.unique(classes))
+    while True:
+        rows = np.full((n_states, width + 1), -1, dtype=np.int64)
+        rows[:, 0] = classes
+        rows[sources, column + 1] = symbols * n_states + classes[targets]
+        _, refined = np.unique(rows, axis=0, return_inverse=True)
+        refined = refined.ravel()
+        n_refined = len(np.unique(refined))
+        classes = refined
+        if n_refined == n_classes:
+            break
+        n_classes = n_refined
+
+    # renumber live classes in order of first appearance from the start
+    live = np.flatnonzero(alive)
+    _, first_seen = np.unique(classes[live], return_index=True)
+    ordered = classes[live][np.sort(first_seen)]
+    new_id = np.full(classes.max() + 1, -1, dtype=np.int64)
+    new_id[ordered] = np.arange(len(ordered))
+    state = new_id[classes]
+    edges = np.unique(
+        np.column_stack([state[sources], symbols, state[targets]]), axis=0
+    ).reshape(-1, 3)
+    minimal_finals = np.zeros(len(ordered), dtype=np.bool_)
+    minimal_finals[state[live[finals[live]]]] = True
+    return len(ordered), 0, minimal_finals, edges[:, 0], edges[:, 1], edges[:, 2]
+
+
+def compile_minimal_dfa(expr: str) -> MinimalDFA:
+    """
+    Compile academic regular expression (the syntax of pyformlang `Regex`)
+    into a minimal DFA: position (Glushkov) automaton, subset construction
+    and partition refinement, all over integer arrays
+    """
+    parser = _Parser(_tokenize(expr))
+    nullable, first, last = parser.parse()
+    n_states, finals, symbols, sources, symbol_ids, targets = _subset_construction(
+        parser, first, nullable, last
+    )
+    n_states, start, finals, sources, symbol_ids, targets = _minimize(
+        n_states, finals, sources, symbol_ids, targets
+    )
+    return MinimalDFA(
+        n_states,
+        start,
+        np.flatnonzero(finals),
+        symbols,
+        sources,
+        symbol_ids,
+        targets,
+    )
@@ -0,0 +1,66 @@
+"""
+Compare forward BFS and bidirectional search on single-pair regular path
+queries over cfpq_data graphs.
+Pairs are sampled at random, the regex defaults to the star of the union
+of the two most frequent labels of the graph.
+
+    python scripts/bench_bidirectional.py --graphs skos travel --pairs 50
+"""
+import argparse
+import random
+import sys
+import time
+
+import shared
+
+sys.path.insert(0, str(shared.ROOT))
+
+from project.dfa_utils import query_bfs, query_bidirectional  # noqa: E402
+from project.graph import load_graph  # noqa: E402
+from project.graph_index import GraphIndex  # noqa: E402
+
+
+def default_regex(index: GraphIndex) -> str:
+    labels = sorted(index.label_counts, key=index.label_counts.get, reverse=True)
+    return f"({' | '.join(labels[:2])})*"
+
+
+def timed(run, pairs) -> tuple:
+    began = time.perf_counter()
+    answers = [bool(run([u], [v])) for u, v in pairs]
+    return time.perf_counter() - began, answers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--graphs", nargs="+", default=["skos", "travel", "univ"])
+    parser.add_argument("--regex", default=None)
+    parser.add_argument("--pairs", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(
+        f"{'graph':>12} {'nodes':>8} {'pairs':>6} {'reachable':>10} "
+        f"{'bfs, s':>10} {'bidir, s':>10}"
+    )
+    for name in args.graphs:
+        index = GraphIndex.from_graph(load_graph(name))
+        regex = args.regex or default_regex(index)
+        rng = random.Random(args.seed)
+        pairs = [
+            (rng.choice(index.nodes), rng.choice(index.nodes))
+            for _ in range(args.pairs)
+        ]
+        bfs_time, expected = timed(lambda u, v: query_bfs(regex, index, u, v), pairs)
+        bidir_time, answers = timed(
+            lambda u, v: query_bidirectional(regex, index, u, v), pairs
+        )
+        assert answers == expected
+        print(
+            f"{name:>12} {index.n_nodes:>8} {len(pairs):>6} {sum(answers):>10} "
+            f"{bfs_time:>10.4f} {bidir_time:>10.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Compare naive and semi-naive (delta) fixpoint iteration of the matrix CFPQ
+algorithm and of the RPQ transitive closure on long chain graphs.
+
+    python scripts/bench_delta.py --sizes 100 200 400
+"""
+import argparse
+import sys
+import time
+
+import networkx as nx
+
+import shared
+
+sys.path.insert(0, str(shared.ROOT))
+
+from pyformlang.cfg import CFG  # noqa: E402
+
+from project.dfa_utils import transitive_closure  # noqa: E402
+from project.graph import apply_matrix_alg  # noqa: E402
+
+GRAMMAR = """
+S -> S S
+S -> a
+"""
+
+
+def chain_graph(n: int, label: str = "a") -> nx.MultiDiGraph:
+    graph = nx.MultiDiGraph()
+    graph.add_edges_from((i, i + 1, {"label": label}) for i in range(n))
+    return graph
+
+
+def _size(result) -> int:
+    return result.nnz if hasattr(result, "nnz") else len(result)
+
+
+def report(name: str, n: int, delta: bool, run):
+    stats = []
+    began = time.perf_counter()
+    result = run(stats)
+    total = time.perf_counter() - began
+    per_round = sum(info.seconds for info in stats) / max(1, len(stats))
+    mode = "delta" if delta else "naive"
+    print(
+        f"{name:>7} {n:>7} {mode:>6} {len(stats):>7} "
+        f"{per_round:>12.5f} {total:>10.4f} {_size(result):>10}"
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 200, 400])
+    args = parser.parse_args()
+
+    cfg = CFG.from_text(GRAMMAR)
+    print(
+        f"{'engine':>7} {'n':>7} {'mode':>6} {'rounds':>7} "
+        f"{'s / round':>12} {'total, s':>10} {'answers':>10}"
+    )
+    for n in args.sizes:
+        graph = chain_graph(n)
+        adjacency = nx.to_scipy_sparse_array(graph, format="csr", dtype=bool)
+        results = [
+            report(
+                "matrix",
+                n,
+                delta,
+                lambda stats: apply_matrix_alg(cfg, graph, stats, delta=delta),
+            )
+            for delta in (False, True)
+        ]
+        assert results[0] == results[1]
+        results = [
+            report(
+                "closure",
+                n,
+                delta,
+                lambda stats: transitive_closure(adjacency, delta, stats),
+            )
+            for delta in (False, True)
+        ]
+        assert (results[0] != results[1]).nnz == 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Compare the indexed Hellings engine with the original list-scan version
+on two cycles graphs of growing size.
+
+    python scripts/bench_hellings.py --sizes 10 20 40 80
+"""
+
+import argparse
+import sys
+import timeit
+
+import shared
+
+sys.path.insert(0, str(shared.ROOT))
+
+from pyformlang.cfg import CFG, Variable  # noqa: E402
+
+from project.cfg import cfg_to_whnf  # noqa: E402
+from project.graph import create_two_cycles_graph, hellings_cfpq  # noqa: E402
+
+GRAMMAR = """
+S -> A B
+S -> A S1
+S1 -> S B
+A -> a
+B -> b
+"""
+
+
+def hellings_cfpq_reference(cfg, graph):
+    """Original implementation, kept as the baseline for the comparison."""
+    cfg = cfg_to_whnf(cfg)
+
+    queue = []
+    result = set()
+
+    for prod in cfg.productions:
+        if len(prod.body) == 0:
+            for node in graph.nodes:
+                t = (node, prod.head, node)
+                result.add(t)
+                queue.append(t)
+        elif len(prod.body) == 1:
+            for u, v, symb in graph.edges.data(data="label"):
+                if Variable(symb) == prod.body[0]:
+                    t = (u, prod.head, v)
+                    result.add(t)
+                    queue.append(t)
+
+    while len(queue) != 0:
+        u, var, v = queue.pop(0)
+        diff = set()
+        for uu, var1, vv in result:
+            if vv == u:
+                for prod in cfg.productions:
+                    if prod.body == [var1, var]:
+                        diff.add((uu, prod.head, v))
+            if uu == v:
+                for prod in cfg.productions:
+                    if prod.body == [var, var1]:
+                        diff.add((u, prod.head, vv))
+        diff = diff.difference(result)
+        queue.extend(diff)
+        result = result.union(diff)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 20, 40, 80])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-reference", action="store_true")
+    args = parser.parse_args()
+
+    cfg = CFG.from_text(GRAMMAR)
+    print(f"{'n':>6} {'m':>6} {'facts':>10} {'indexed, s':>12} {'reference, s':>14}")
+    for n in args.sizes:
+        m = max(1, n // 2)
+        graph = create_two_cycles_graph(n, m)
+        facts = hellings_cfpq(cfg, graph)
+        indexed = min(
+            timeit.repeat(
+                lambda: hellings_cfpq(cfg, graph), number=1, repeat=args.repeat
+            )
+        )
+        reference = float("nan")
+        if not args.skip_reference:
+            assert hellings_cfpq_reference(cfg, graph) == facts
+            reference = min(
+                timeit.repeat(
+                    lambda: hellings_cfpq_reference(cfg, graph),
+                    number=1,
+                    repeat=args.repeat,
+                )
+            )
+        print(f"{n:>6} {m:>6} {len(facts):>10} {indexed:>12.4f} {reference:>14.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Benchmark RPQ and CFPQ engines.
+
+Every (graph, engine) pair runs in a fresh process, so peak RSS is measured
+for that pair alone. Wall time is taken over `--repeats` runs with the query
+cache cleared before each run. Results are written to `<out>.json` and
+`<out>.csv`; with `--baseline` the median times and result sizes are
+compared against a previous JSON report and regressions make the script
+exit with status 1.
+
+Graphs are `two_cycles:<n>,<m>` (labels `a`, `b`) or cfpq_data names, which
+are downloaded once and kept as memory-mapped indexes in `--cache`.
+Queries over cfpq_data graphs use their two most frequent labels.
+
+    python scripts/benchmark.py --graphs two_cycles:100,80 skos \\
+        --engines query bfs hellings matrix --out report
+    python scripts/benchmark.py --graphs two_cycles:100,80 \\
+        --out report2 --baseline report.json
+    python scripts/benchmark.py --graphs two_cycles:1000,800 skos wc \\
+        --engines query query_scc --out closure
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import platform
+import random
+import resource
+import statistics
+import sys
+import time
+
+import shared
+
+sys.path.insert(0, str(shared.ROOT))
+
+from pyformlang.cfg import CFG, Variable  # noqa: E402
+
+from project.dfa_utils import query, query_bfs, query_bidirectional  # noqa: E402
+from project.graph import (  # noqa: E402
+    apply_matrix_alg,
+    create_two_cycles_graph,
+    hellings_cfpq,
+    load_graph_mmap,
+    tensor_cfpq,
+)
+from project.graph_index import GraphIndex  # noqa: E402
+from project.query_cache import default_cache  # noqa: E402
+
+ENGINES = {
+    "query": lambda q: query(q["regex"], q["graph"], q["starts"], q["finals"]),
+    "query_scc": lambda q: query(
+        q["regex"], q["graph"], q["starts"], q["finals"], closure="scc"
+    ),
+    "bfs": lambda q: query_bfs(q["regex"], q["graph"], q["starts"], q["finals"]),
+    "bfs_each": lambda q: query_bfs(
+        q["regex"], q["graph"], q["starts"], q["finals"], type=False
+    ),
+    "bidirectional": lambda q: query_bidirectional(
+        q["regex"], q["graph"], q["starts"], q["finals"], type=False
+    ),
+    "hellings": lambda q: start_facts(hellings_cfpq(q["cfg"], q["graph"])),
+    "matrix": lambda q: start_facts(apply_matrix_alg(q["cfg"], q["graph"])),
+    "tensor": lambda q: start_facts(tensor_cfpq(q["cfg"], q["graph"])),
+}
+# one search per (start, final) pair, meant for small `--starts`
+DEFAULT_ENGINES = [engine for engine in ENGINES if engine != "bidirectional"]
+
+FIELDS = [
+    "graph",
+    "engine",
+    "nodes",
+    "edges",
+    "starts",
+    "repeats",
+    "median_s",
+    "min_s",
+    "peak_rss_kb",
+    "result_size",
+]
+
+
+def start_facts(facts: set) -> set:
+    """Facts of the start symbol, comparable between CFPQ engines"""
+    return {(u, v) for u, var, v in facts if var == Variable("S")}
+
+
+def load_index(spec: str, cache: str) -> GraphIndex:
+    if spec.startswith("two_cycles:"):
+        n, m = (int(x) for x in spec.split(":", 1)[1].split(","))
+        return GraphIndex.from_graph(create_two_cycles_graph(n, m, ("a", "b")))
+    return load_graph_mmap(spec, cache)
+
+
+def make_query(index: GraphIndex, n_starts: int, seed: int) -> dict:
+    labels = sorted(index.label_counts, key=index.label_counts.get, reverse=True)
+    first, second = (labels + labels)[:2] if labels else ("a", "b")
+    nodes = list(index.nodes)
+    if n_starts is not None and n_starts < len(nodes):
+        starts = random.Random(seed).sample(nodes, n_starts)
+    else:
+        starts = nodes
+    return {
+        "graph": index,
+        "regex": f"{first}* {second}",
+        "cfg": CFG.from_text(f"S -> {first} S {second} | {first} {second}"),
+        "starts": starts,
+        "finals": nodes,
+    }
+
+
+def result_size(result) -> int:
+    if isinstance(result, dict):
+        return sum(len(v) for v in result.values())
+    return len(result)
+
+
+def measure(spec: str, engine: str, args: argparse.Namespace) -> dict:
+    """Run in a child process: time the engine, report its peak RSS"""
+    index = load_index(spec, args.cache)
+    q = make_query(index, args.starts, args.seed)
+    run = ENGINES[engine]
+    times = []
+    size = None
+    for _ in range(args.repeats):
+        default_cache.clear()
+        began = time.perf_counter()
+        result = run(q)
+        times.append(time.perf_counter() - began)
+        size = result_size(result)
+    return {
+        "graph": spec,
+        "engine": engine,
+        "nodes": index.n_nodes,
+        "edges": index.n_edges,
+        "starts": len(q["starts"]),
+        "repeats": args.repeats,
+        "median_s": statistics.median(times),
+        "min_s": min(times),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "result_size": size,
+        "times_s": times,
+    }
+
+
+def compare(rows: list, baseline: dict, tolerance: float) -> list:
+    """Messages about pairs slower than baseline or with other result sizes"""
+    previous = {(row["graph"], row["engine"]): row for row in baseline["results"]}
+    regressions = []
+    for row in rows:
+        old = previous.get((row["graph"], row["engine"]))
+        if old is None:
+            continue
+        key = f"{row['graph']} / {row['engine']}"
+        if row["result_size"] != old["result_size"]:
+            regressions.append(
+                f"{key}: result size {row['result_size']}, was {old['result_size']}"
+            )
+        if row["median_s"] > old["median_s"] * (1 + tolerance):
+            regressions.append(
+                f"{key}: median {row['median_s']:.4f}s, was {old['median_s']:.4f}s"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--graphs", nargs="+", default=["two_cycles:50,40"])
+    parser.add_argument(
+        "--engines", nargs="+", choices=list(ENGINES), default=DEFAULT_ENGINES
+    )
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--starts", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache", default=str(shared.ROOT / ".graphs"))
+    parser.add_argument("--out", default="benchmark")
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    rows = []
+    context = multiprocessing.get_context("spawn")
+    for spec in args.graphs:
+        for engine in args.engines:
+            with context.Pool(1) as pool:
+                row = pool.apply(measure, (spec, engine, args))
+            rows.append(row)
+            print(
+                f"{spec:>20} {engine:>14} {row['median_s']:>10.4f}s "
+                f"{row['peak_rss_kb']:>10} KB {row['result_size']:>10}"
+            )
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "results": rows,
+    }
+    with open(f"{args.out}.json", "w") as file:
+        json.dump(report, file, indent=2)
+    with open(f"{args.out}.csv", "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            regressions = compare(rows, json.load(file), args.tolerance)
+        for message in regressions:
+            print("REGRESSION", message)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
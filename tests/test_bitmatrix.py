@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from pyformlang.cfg import CFG
+from scipy.sparse import random as sparse_random
+
+from project.bitmatrix import BitMatrix, choose_backend, is_packed
+from project.dfa_utils import transitive_closure
+from project.graph import apply_matrix_alg, create_two_cycles_graph
+
+
+def random_bool(rows: int, cols: int, density: float, seed: int):
+    return sparse_random(
+        rows, cols, density=density, format="csr", random_state=seed
+    ).astype(np.bool_)
+
+
+@pytest.mark.parametrize("shape", [(1, 1), (7, 13), (70, 65), (130, 9)])
+def test_roundtrip_and_count(shape):
+    matrix = random_bool(*shape, 0.3, seed=1)
+    packed = BitMatrix.from_sparse(matrix)
+
+    assert packed.count() == matrix.nnz
+    assert (packed.to_sparse() != matrix).nnz == 0
+
+
+@pytest.mark.parametrize("n, m, k", [(5, 3, 4), (67, 70, 129), (10, 200, 3)])
+def test_multiply(n: int, m: int, k: int):
+    a = random_bool(n, m, 0.2, seed=2)
+    b = random_bool(m, k, 0.2, seed=3)
+    expected = a @ b
+    packed_a, packed_b = BitMatrix.from_sparse(a), BitMatrix.from_sparse(b)
+
+    assert (packed_a.multiply_blocked(packed_b).to_sparse() != expected).nnz == 0
+    assert (packed_a.multiply_rows(packed_b).to_sparse() != expected).nnz == 0
+
+
+def test_choose_backend():
+    sparse = random_bool(100, 100, 0.01, seed=4)
+    dense = random_bool(100, 100, 0.5, seed=5)
+
+    assert not is_packed(choose_backend(sparse, 0.25))
+    assert is_packed(choose_backend(dense, 0.25))
+    assert not is_packed(choose_backend(dense, None))
+
+
+@pytest.mark.parametrize("delta", [False, True])
+def test_packed_closure(delta: bool):
+    matrix = random_bool(90, 90, 0.02, seed=6)
+    sparse = transitive_closure(matrix, delta, packed_density=None)
+    packed = transitive_closure(matrix, delta, packed_density=0.0)
+
+    assert (sparse != packed).nnz == 0
+
+
+@pytest.mark.parametrize("delta", [False, True])
+def test_packed_matrix_alg(delta: bool):
+    cfg = CFG.from_text("S -> a S b | a b | S S")
+    g = create_two_cycles_graph(4, 3)
+
+    assert apply_matrix_alg(cfg, g, delta=delta, packed_density=0.0) == (
+        apply_matrix_alg(cfg, g, delta=delta, packed_density=None)
+    )
@@ -1,8 +1,11 @@
+import itertools
+import pytest
 import tempfile
 
 from pyformlang.cfg import Variable, Terminal
 from pyformlang.cfg.cfg import CFG
 import project.cfg as CFD
+from project.cyk import CYKRecognizer
 from project.graph import create_two_cycles_graph, apply_matrix_alg
 
 
@@ -65,3 +68,93 @@ def test_matrices():
         (1, Variable("S1"), 0),
         (0, Variable("S"), 0),
     }
+
+
+def test_matrices_stats():
+    cfg = CFG.from_text(
+        """
+        S -> A B
+        S -> A S1
+        S1 -> S B
+        A -> a
+        B -> b
+        """
+    )
+    stats = []
+    result = apply_matrix_alg(cfg, create_two_cycles_graph(2, 1), stats)
+
+    assert len(stats) >= 2
+    assert [info.iteration for info in stats] == list(range(1, len(stats) + 1))
+    assert stats[-1].nnz == len(result)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "S -> A B\nS -> A S1\nS1 -> S B\nA -> a\nB -> b",
+        "S -> epsilon\nS -> a S b\nS -> S S",
+    ],
+)
+def test_matrices_delta(text: str):
+    cfg = CFG.from_text(text)
+    g = create_two_cycles_graph(3, 2)
+    assert apply_matrix_alg(cfg, g, delta=True) == apply_matrix_alg(cfg, g)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        """
+        S -> a b c d | e b c d | A
+        A -> S S | epsilon | B
+        B -> b
+        D -> d
+        """,
+        """
+        S -> A B C | a S b
+        A -> a A | epsilon
+        B -> C | b
+        C -> c C | epsilon | B
+        """,
+        """
+        S -> S S | A
+        A -> a
+        E -> E a
+        """,
+    ],
+)
+def test_whnf_fast(text):
+    cfg = CFG.from_text(text)
+    stats = []
+    wcnf = CFD.cfg_to_whnf_fast(cfg, stats)
+
+    assert [info.stage for info in stats] == [
+        "encode",
+        "useless",
+        "units",
+        "useless",
+        "binarize",
+        "decode",
+    ]
+    for prod in wcnf.productions:
+        body = prod.body
+        assert (
+            len(body) == 0
+            or len(body) == 1
+            and isinstance(body[0], Terminal)
+            or len(body) == 2
+            and all(isinstance(x, Variable) for x in body)
+        )
+
+    expected = CYKRecognizer.from_wcnf(CFD.cfg_to_whnf(cfg))
+    got = CYKRecognizer.from_wcnf(wcnf)
+    for length in range(7):
+        for word in itertools.product("abcde", repeat=length):
+            assert got.accepts(word) == expected.accepts(word), word
+
+
+def test_whnf_fast_shares_suffixes():
+    cfg = CFG.from_text("S -> a b c d | b b c d | c b c d")
+    wcnf = CFD.cfg_to_whnf_fast(cfg)
+    # S, one variable per terminal and one per suffix "b c d", "c d"
+    assert len(wcnf.variables) == 7
@@ -0,0 +1,49 @@
+import itertools
+
+import pytest
+from pyformlang.cfg import CFG
+
+from project.cfg import cfg_to_whnf
+from project.cyk import CYKRecognizer, cyk
+
+GRAMMARS = [
+    """
+    S -> epsilon
+    S -> a S b
+    S -> S S
+    """,
+    """
+    S -> A B C
+    A -> a A | epsilon
+    B -> b
+    C -> c C | epsilon
+    """,
+    """
+    S -> a S a | b S b | a | b
+    """,
+]
+
+
+def words(alphabet, max_length):
+    for length in range(max_length + 1):
+        yield from itertools.product(alphabet, repeat=length)
+
+
+@pytest.mark.parametrize("text", GRAMMARS)
+def test_cyk_matches_pyformlang(text):
+    cfg = CFG.from_text(text)
+    recognizer = CYKRecognizer.from_wcnf(cfg_to_whnf(cfg))
+    for word in words("abc", 6):
+        assert recognizer.accepts(word) == cfg.contains(word), word
+
+
+def test_cyk_string_and_batch():
+    cfg = CFG.from_text(GRAMMARS[0])
+    assert cyk(cfg, "aabb")
+    assert not cyk(cfg, "abba")
+
+    recognizer = CYKRecognizer.from_cfg(cfg)
+    batch = ["", "ab", "ba", "aabbab", "aab"] * 4
+    expected = [recognizer.accepts(word) for word in batch]
+    assert recognizer.accepts_many(batch) == expected
+    assert recognizer.accepts_many(batch, workers=2) == expected
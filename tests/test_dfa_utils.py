@@ -1,6 +1,23 @@
+import networkx as nx
+import numpy as np
 import pytest
+from scipy import sparse
 from pyformlang.finite_automaton import DeterministicFiniteAutomaton, State
-from project.dfa_utils import regex2dfa, graph2nfa, query, nfa_intersect
+from project.dfa_utils import (
+    regex2dfa,
+    graph2nfa,
+    query,
+    query_iter,
+    query_bfs,
+    query_bidirectional,
+    query_many,
+    BFSBasedRPQ_type,
+    nfa_intersect,
+    intersect_matrices,
+    BoolMatrixAutomaton,
+    scc_closure,
+    transitive_closure,
+)
 from project.graph import create_two_cycles_graph
 
 
@@ -34,3 +51,135 @@ def test_query():
 
     assert set() == query(regex, graph, [1], [0])
     assert {(0, 0)} == query(regex, graph, [0], [0])
+
+
+def test_query_delta():
+    regex = "(1 1 1 1|0 0 0 0)*"
+    graph = create_two_cycles_graph(3, 3, ("1", "0"))
+    nodes = list(graph.nodes)
+
+    assert query(regex, graph, nodes, nodes, delta=True) == query(
+        regex, graph, nodes, nodes
+    )
+
+
+@pytest.mark.parametrize("regex", ["(1 1 1 1|0 0 0 0)*", "1* 0", "1 0 1", "2"])
+def test_query_scc(regex):
+    graph = create_two_cycles_graph(4, 3, ("1", "0"))
+    nodes = list(graph.nodes)
+
+    assert query(regex, graph, nodes, nodes, closure="scc") == query(
+        regex, graph, nodes, nodes
+    )
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_scc_closure(seed):
+    rng = np.random.default_rng(seed)
+    matrix = sparse.random(60, 60, density=0.03, random_state=seed, format="csr")
+    matrix = matrix.astype(bool)
+    rows, cols = rng.choice(60, size=10), rng.choice(60, size=15)
+    expected = transitive_closure(matrix).toarray()
+
+    assert (scc_closure(matrix).toarray() == expected).all()
+    assert (scc_closure(matrix, rows, cols).toarray() == expected[rows][:, cols]).all()
+
+
+def test_query_unknown_nodes():
+    graph = create_two_cycles_graph(3, 2)
+
+    assert query("a*", graph, [0, 99], [0, 98]) == {(0, 0)}
+    assert list(query_iter("a*", graph, [0, 99], [0, 98])) == [(0, 0)]
+    assert list(query_iter("a*", graph, [], [], target=(99, 0))) == []
+
+
+def test_bfs_unknown_nodes():
+    graph = create_two_cycles_graph(3, 2)
+
+    assert query_bfs("a a", graph, [0, 99], [2, 98]) == {2}
+    assert query_bfs("a a", graph, [0, 99], [2, 98], type=False) == {
+        0: {2},
+        99: set(),
+    }
+    answers = query_bfs("a a", graph, [99, 0], [2], type=False, columnar=True)
+    assert answers.to_set() == {(0, 2)}
+    assert query_many(["a a", "b"], graph, [0, 99], [2, 98], type=False) == [
+        {0: {2}, 99: set()},
+        {0: set(), 99: set()},
+    ]
+    assert query_bidirectional("a a", graph, [0, 99], [2, 98], type=False) == {
+        0: {2},
+        99: set(),
+    }
+    assert BFSBasedRPQ_type("a a", graph, [0, 99], type=False) == {0: {2}, 99: set()}
+
+
+def test_intersect_different():
+    nfa = graph2nfa(create_two_cycles_graph(3, 3, ("1", "0")), [0], [0])
+    ones = regex2dfa("(1 1 1 1)*")
+    assert nfa_intersect(nfa, ones).is_equivalent_to(ones)
+    assert nfa_intersect(ones, nfa).is_equivalent_to(ones)
+
+
+def test_intersect_matrices():
+    a1 = BoolMatrixAutomaton.from_nfa(regex2dfa("1 0*"))
+    a2 = BoolMatrixAutomaton.from_graph(
+        create_two_cycles_graph(3, 3, ("1", "0")), [0], [0]
+    )
+    product = intersect_matrices(a1, a2)
+
+    assert product.n_states == a1.n_states * a2.n_states
+    assert set(product.matrices.keys()) == {"1", "0"}
+    assert product.to_epsilon_nfa().is_empty()
+
+
+def test_query_answers():
+    regex = "1 1* 0*"
+    graph = create_two_cycles_graph(2, 1, ("1", "0"))
+    nodes = list(graph.nodes)
+
+    assert query(regex, graph, [0], nodes) == {(0, 1), (0, 2), (0, 0), (0, 3)}
+
+
+def test_query_iter():
+    regex = "1 1* 0*"
+    graph = create_two_cycles_graph(3, 2, ("1", "0"))
+    nodes = list(graph.nodes)
+
+    expected = query(regex, graph, nodes, nodes)
+    streamed = list(query_iter(regex, graph, nodes, nodes))
+    assert len(streamed) == len(set(streamed))
+    assert set(streamed) == expected
+
+    assert len(list(query_iter(regex, graph, nodes, nodes, limit=3))) == 3
+    assert list(query_iter(regex, graph, nodes, nodes, limit=0)) == []
+    assert list(query_iter(regex, graph, [], [], target=(0, 1))) == [(0, 1)]
+    assert list(query_iter("0 0", graph, nodes, nodes, target=(1, 0))) == []
+
+
+def test_query_iter_high_degree():
+    graph = nx.MultiDiGraph()
+    graph.add_edges_from((0, i, {"label": "a"}) for i in range(1, 257))
+    finals = range(1, 257)
+
+    expected = query("a", graph, [0], finals)
+    assert len(expected) == 256
+    assert set(query_iter("a", graph, [0], finals)) == expected
+
+
+def test_columnar_answers():
+    regex = "a* b (a | b)"
+    graph = create_two_cycles_graph(4, 3)
+    nodes = list(graph.nodes)
+
+    answers = query(regex, graph, nodes[:3], nodes, columnar=True)
+    assert answers.to_set() == query(regex, graph, nodes[:3], nodes)
+    assert len(answers) == len(answers.to_set()) == answers.to_matrix().nnz
+    sources, targets = answers.names()
+    assert set(zip(sources, targets)) == answers.to_set()
+
+    bfs = query_bfs(regex, graph, nodes[:3], nodes[2:], type=False, columnar=True)
+    expected = query_bfs(regex, graph, nodes[:3], nodes[2:], type=False)
+    assert bfs.to_set() == {(u, v) for u, vs in expected.items() for v in vs}
+    reached = query_bfs(regex, graph, nodes[:3], nodes[2:], columnar=True)
+    assert {nodes[i] for i in reached} == query_bfs(regex, graph, nodes[:3], nodes[2:])
@@ -1,6 +1,6 @@
 import pytest
 from typing import Dict
-from project.ecfg import ECFG
+from project.ecfg import ECFG, RFA
 from pyformlang.cfg import CFG, Variable
 from pyformlang.regular_expression import Regex
 
@@ -19,3 +19,32 @@ def test_1(text: str, expected: Dict[Variable, Regex]):
         nfa1 = ecfg.productions[key].to_epsilon_nfa()
         nfa2 = expected[key].to_epsilon_nfa()
         assert nfa1.is_equivalent_to(nfa2)
+
+
+GRAMMAR = """
+S -> epsilon | a S b S | a b c | a b
+T -> S S | c b c | b c
+"""
+
+
+def test_rfa_from_cfg():
+    cfg = CFG.from_text(GRAMMAR)
+    rfa = RFA.from_cfg(cfg)
+    expected = ECFG.from_cfg(cfg).to_rfa()
+
+    assert rfa.dfas.keys() == {Variable("S"), Variable("T")}
+    for head, dfa in rfa.dfas.items():
+        assert dfa.is_equivalent_to(expected.dfas[head.value])
+        assert len(dfa.states) == len(expected.dfas[head.value].states)
+
+
+def test_rfa_matrices_reproducible():
+    cfg = CFG.from_text(GRAMMAR)
+    matrices, state_idx = RFA.from_cfg(cfg).to_matrices()
+    matrices2, state_idx2 = RFA.from_cfg(cfg).to_matrices()
+
+    assert list(state_idx.items()) == list(state_idx2.items())
+    assert sorted(state_idx.values()) == list(range(len(state_idx)))
+    assert list(matrices.keys()) == list(matrices2.keys())
+    for symb, matrix in matrices.items():
+        assert (matrix != matrices2[symb]).nnz == 0
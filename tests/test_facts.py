@@ -0,0 +1,51 @@
+from pyformlang.cfg import CFG, Variable
+
+from project.facts import FactStore
+from project.graph import (
+    apply_matrix_alg,
+    create_two_cycles_graph,
+    hellings_cfpq,
+    tensor_cfpq,
+)
+
+GRAMMAR = """
+S -> epsilon
+S -> a S b
+S -> S S
+"""
+
+
+def test_store_matches_tuple_set():
+    cfg = CFG.from_text(GRAMMAR)
+    graph = create_two_cycles_graph(3, 2)
+    facts = hellings_cfpq(cfg, graph)
+
+    for store in (
+        apply_matrix_alg(cfg, graph, store=True),
+        hellings_cfpq(cfg, graph, store=True),
+    ):
+        assert isinstance(store, FactStore)
+        assert len(store) == len(facts)
+        assert store.to_set() == facts
+        assert all(fact in store for fact in facts)
+        assert (0, Variable("S"), "missing") not in store
+        assert store.nbytes == 8 * len(facts)
+
+
+def test_store_adjacency():
+    cfg = CFG.from_text(GRAMMAR)
+    graph = create_two_cycles_graph(3, 2)
+    store = tensor_cfpq(cfg, graph, store=True)
+    facts = store.to_set()
+    S = Variable("S")
+
+    for node in graph.nodes:
+        assert sorted(store.successors(node, S)) == sorted(
+            v for u, var, v in facts if u == node and var == S
+        )
+        assert sorted(store.predecessors(node, S)) == sorted(
+            u for u, var, v in facts if v == node and var == S
+        )
+    us, vs = store.pairs(S)
+    assert len(us) == len(vs) == sum(len(store.successors(u, S)) for u in graph)
+    assert store.successors(0, Variable("X")) == []
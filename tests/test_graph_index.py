@@ -0,0 +1,110 @@
+import pathlib
+import tempfile
+
+import cfpq_data
+import networkx as nx
+import pytest
+from pyformlang.cfg import CFG, Variable
+
+from project.dfa_utils import query, query_bfs
+from project.graph import (
+    GraphInfo,
+    apply_matrix_alg,
+    apply_matrix_text,
+    apply_matrix_text_dot,
+    create_two_cycles_graph,
+    graph_info,
+    hellings_cfpq,
+    query_cfg_graph,
+    save_graph,
+    tensor_cfpq,
+)
+from project.graph_index import (
+    GraphIndex,
+    as_graph_index,
+    convert_graph,
+    load_graph_index,
+    read_edge_list,
+    save_graph_index,
+)
+
+
+def test_index_structure():
+    graph = create_two_cycles_graph(2, 1)
+    index = GraphIndex.from_graph(graph)
+
+    assert as_graph_index(index) is index
+    assert index.nodes == list(graph.nodes)
+    assert index.label_counts == {"a": 3, "b": 2}
+    assert graph_info(index) == graph_info(graph) == GraphInfo(4, 5, {"a", "b"})
+    for label, matrix in index.adjacency.items():
+        assert (index.transposed[label] != matrix.T).nnz == 0
+
+
+def test_entry_points_accept_index():
+    graph = create_two_cycles_graph(3, 2)
+    index = GraphIndex.from_graph(graph)
+    nodes = list(graph.nodes)
+    cfg = CFG.from_text("S -> a S b | a b")
+    regex = "a* b"
+
+    assert query(regex, index, nodes, nodes) == query(regex, graph, nodes, nodes)
+    assert query_bfs(regex, index, nodes, nodes) == query_bfs(
+        regex, graph, nodes, nodes
+    )
+    assert query_bfs(regex, index, nodes, nodes, type=False) == query_bfs(
+        regex, graph, nodes, nodes, type=False
+    )
+    assert hellings_cfpq(cfg, index) == hellings_cfpq(cfg, graph)
+    assert apply_matrix_alg(cfg, index) == apply_matrix_alg(cfg, graph)
+    assert tensor_cfpq(cfg, index) == tensor_cfpq(cfg, graph)
+    assert query_cfg_graph(cfg, index, Variable("S"), nodes, nodes) == (
+        query_cfg_graph(cfg, graph, Variable("S"), nodes, nodes)
+    )
+
+
+def test_binary_roundtrip():
+    graph = create_two_cycles_graph(3, 2)
+    index = GraphIndex.from_graph(graph)
+    path = tempfile.mkdtemp()
+    save_graph_index(index, path)
+
+    loaded = load_graph_index(path)
+    assert not loaded.adjacency["a"].indices.flags.writeable
+    assert graph_info(loaded) == graph_info(graph)
+    nodes = list(graph.nodes)
+    assert query("a* b", loaded, nodes, nodes) == query("a* b", graph, nodes, nodes)
+
+
+def test_convert_csv():
+    graph = create_two_cycles_graph(3, 2)
+    directory = pathlib.Path(tempfile.mkdtemp())
+    csv_path = cfpq_data.graph_to_csv(graph, directory / "graph.csv")
+
+    converted = convert_graph(str(csv_path), str(directory / "bin"))
+    loaded = load_graph_index(str(directory / "bin"))
+    assert graph_info(converted) == graph_info(loaded) == graph_info(graph)
+    nodes = list(graph.nodes)
+    assert query_bfs("a b", loaded, nodes, nodes, type=False) == query_bfs(
+        "a b", graph, nodes, nodes, type=False
+    )
+
+
+@pytest.mark.parametrize("chunk_size", [2, 1 << 16])
+def test_read_edge_list(chunk_size: int):
+    graph = create_two_cycles_graph(4, 3)
+    directory = pathlib.Path(tempfile.mkdtemp())
+    csv_path = cfpq_data.graph_to_csv(graph, directory / "graph.csv")
+    dot_path = str(directory / "graph.dot")
+    save_graph(graph, dot_path)
+
+    from_csv = read_edge_list(str(csv_path), chunk_size)
+    assert from_csv.nodes == list(graph.nodes)
+    assert graph_info(from_csv) == graph_info(graph)
+
+    from_dot = read_edge_list(dot_path, chunk_size)
+    dot_graph = nx.nx_pydot.read_dot(dot_path)
+    assert from_dot.nodes == list(dot_graph.nodes)
+    assert graph_info(from_dot) == graph_info(dot_graph)
+    cfg = "S -> a S b | a b"
+    assert apply_matrix_text_dot(cfg, dot_path) == apply_matrix_text(cfg, dot_graph)
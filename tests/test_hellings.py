@@ -1,5 +1,11 @@
 from pyformlang.cfg import CFG, Variable
-from project.graph import create_two_cycles_graph, query_cfg_graph
+from project.graph import (
+    create_two_cycles_graph,
+    query_cfg_graph,
+    query_cfg_iter,
+    hellings_cfpq,
+    apply_matrix_alg,
+)
 
 
 def test_query_cfg_sf():
@@ -20,3 +26,37 @@ def test_query_cfg_sf():
         2: {0, 3},
         3: set(),
     }
+
+
+def test_hellings_matches_matrix():
+    cfg = CFG.from_text(
+        """
+        S -> epsilon
+        S -> a S b
+        S -> S S
+        """
+    )
+    g = create_two_cycles_graph(4, 3)
+    assert hellings_cfpq(cfg, g) == apply_matrix_alg(cfg, g)
+
+
+def test_query_cfg_iter():
+    cfg = CFG.from_text(
+        """
+        S -> epsilon
+        S -> a S b
+        S -> S S
+        """
+    )
+    g = create_two_cycles_graph(3, 2)
+    nodes = list(g.nodes)
+    expected = {
+        (u, v)
+        for u, finals in query_cfg_graph(cfg, g, Variable("S"), nodes, nodes).items()
+        for v in finals
+    }
+    assert set(query_cfg_iter(cfg, g, Variable("S"), nodes, nodes)) == expected
+    assert len(list(query_cfg_iter(cfg, g, Variable("S"), nodes, nodes, limit=2))) == 2
+    u, v = next(iter(expected))
+    target = list(query_cfg_iter(cfg, g, Variable("S"), [], [], target=(u, v)))
+    assert target == [(u, v)]
@@ -0,0 +1,62 @@
+import random
+
+import pytest
+from pyformlang.cfg import CFG, Variable
+
+from project.dfa_utils import query_bfs
+from project.graph import create_two_cycles_graph, query_cfg_graph
+from project.incremental import IncrementalCFPQ, IncrementalRPQ
+
+
+def split_edges(n: int, m: int, seed: int):
+    graph = create_two_cycles_graph(n, m)
+    edges = [(u, label, v) for u, v, label in graph.edges.data("label")]
+    random.Random(seed).shuffle(edges)
+    half = len(edges) // 2
+    first = graph.copy()
+    first.remove_edges_from([(u, v) for u, _, v in edges[half:]])
+    return graph, first, edges[half:]
+
+
+def pairs_of(result):
+    return {(u, v) for u, vs in result.items() for v in vs}
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_incremental_cfpq(seed: int):
+    cfg = CFG.from_text("S -> a S b | a b")
+    graph, first, rest = split_edges(4, 3, seed)
+    nodes = list(graph.nodes)
+
+    incremental = IncrementalCFPQ(cfg, first)
+    before = incremental.pairs
+    new = set()
+    for edge in rest:
+        added = incremental.add_edges([edge])
+        assert not added & (before | new)
+        new |= added
+
+    expected = pairs_of(query_cfg_graph(cfg, graph, Variable("S"), nodes, nodes))
+    assert incremental.pairs == before | new == expected
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_incremental_rpq(seed: int):
+    regex = "a* b (a | b)"
+    graph, first, rest = split_edges(4, 3, seed)
+    nodes = list(graph.nodes)
+
+    incremental = IncrementalRPQ(regex, first)
+    before = incremental.pairs
+    new = incremental.add_edges(rest)
+
+    assert not new & before
+    expected = pairs_of(query_bfs(regex, graph, nodes, nodes, type=False))
+    assert incremental.pairs == before | new == expected
+
+
+def test_incremental_rpq_new_nodes():
+    incremental = IncrementalRPQ("a b", create_two_cycles_graph(1, 1), starts=[0])
+
+    assert incremental.add_edges([(1, "a", 10), (10, "b", 11)]) == set()
+    assert incremental.add_edges([(0, "a", 12), (12, "b", 13)]) == {(0, 13)}
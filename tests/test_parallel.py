@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from pyformlang.cfg import CFG
+from scipy.sparse import random as sparse_random
+
+from project.bitmatrix import BitMatrix, to_sparse
+from project.dfa_utils import query
+from project.graph import apply_matrix_alg, create_two_cycles_graph, tensor_cfpq
+from project.parallel import MatrixPool
+
+
+def random_bool(rows: int, cols: int, seed: int):
+    return sparse_random(
+        rows, cols, density=0.1, format="csr", random_state=seed
+    ).astype(np.bool_)
+
+
+def test_pool_matmul():
+    a, b = random_bool(50, 40, 1), random_bool(40, 30, 2)
+    with MatrixPool(3) as pool:
+        sparse, packed, mixed = pool.matmul_many(
+            [
+                (a, b),
+                (BitMatrix.from_sparse(a), BitMatrix.from_sparse(b)),
+                (a, BitMatrix.from_sparse(b)),
+            ]
+        )
+
+    expected = a @ b
+    for product in (sparse, packed, mixed):
+        assert (to_sparse(product) != expected).nnz == 0
+
+
+@pytest.mark.parametrize("delta", [False, True])
+def test_parallel_matrix_alg(delta: bool):
+    cfg = CFG.from_text("S -> a S b | a b | S S")
+    g = create_two_cycles_graph(4, 3)
+
+    assert apply_matrix_alg(cfg, g, delta=delta, workers=2) == apply_matrix_alg(
+        cfg, g, delta=delta
+    )
+
+
+def test_parallel_closure_engines():
+    g = create_two_cycles_graph(4, 3)
+    nodes = list(g.nodes)
+    cfg = CFG.from_text("S -> a S b | a b")
+
+    assert query("a* b", g, nodes, nodes, workers=2) == query("a* b", g, nodes, nodes)
+    assert tensor_cfpq(cfg, g, workers=2) == tensor_cfpq(cfg, g)
+    assert tensor_cfpq(cfg, g, [0, 2], workers=2) == tensor_cfpq(cfg, g, [0, 2])
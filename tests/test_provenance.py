@@ -0,0 +1,98 @@
+import tracemalloc
+
+import pytest
+from pyformlang.cfg import CFG, Variable
+
+from project.dfa_utils import query_bfs, regex2dfa
+from project.graph import create_two_cycles_graph, hellings_cfpq
+from project.graph_index import GraphIndex
+from project.provenance import CFPQProvenance, RPQProvenance
+
+GRAMMAR = """
+S -> epsilon
+S -> a S b
+S -> S S
+"""
+
+
+def assert_walk(graph, path, u, v):
+    node = u
+    for x, label, y in path:
+        assert x == node
+        assert any(d["label"] == label for d in graph.get_edge_data(x, y).values())
+        node = y
+    assert node == v
+
+
+def test_cfpq_witnesses():
+    cfg = CFG.from_text(GRAMMAR)
+    graph = create_two_cycles_graph(3, 2)
+    provenance = CFPQProvenance(cfg, graph)
+    lengths = CFPQProvenance(cfg, graph, lengths_only=True)
+
+    assert provenance.facts == hellings_cfpq(cfg, graph)
+    assert provenance.nbytes == 36 * len(provenance.length)
+    assert lengths.nbytes == 24 * len(lengths.length)
+    for u, v in provenance.pairs:
+        path = provenance.extract_path(u, v)
+        assert_walk(graph, path, u, v)
+        assert cfg.contains([label for _, label, _ in path])
+        assert len(path) == provenance.path_length(u, v) == lengths.path_length(u, v)
+    assert provenance.path_length(0, 0) == 0
+    with pytest.raises(ValueError):
+        lengths.extract_path(0, 0)
+
+
+def test_cfpq_peak_memory():
+    cfg = CFG.from_text("S -> a S b | a b | S S")
+    CFPQProvenance(cfg, create_two_cycles_graph(2, 1))
+    index = GraphIndex.from_graph(create_two_cycles_graph(120, 90))
+
+    tracemalloc.start()
+    try:
+        provenance = CFPQProvenance(cfg, index)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < 150 * len(provenance.length)
+
+
+def test_cfpq_no_witness():
+    cfg = CFG.from_text("S -> a b")
+    graph = create_two_cycles_graph(2, 1)
+    provenance = CFPQProvenance(cfg, graph, Variable("S"))
+    assert provenance.extract_path(1, 1) is None
+    assert provenance.path_length(1, 1) is None
+
+
+@pytest.mark.parametrize("regex", ["a* b b", "(a | b)*", "b a"])
+def test_rpq_witnesses(regex):
+    graph = create_two_cycles_graph(4, 3)
+    nodes = list(graph.nodes)
+    dfa = regex2dfa(regex)
+    provenance = RPQProvenance(regex, graph, max_sources=2)
+    lengths = RPQProvenance(regex, graph, lengths_only=True, max_sources=2)
+
+    for u in nodes:
+        reachable = query_bfs(regex, graph, [u], nodes)
+        assert provenance.reachable(u) == reachable
+        for v in nodes:
+            path = provenance.extract_path(u, v)
+            if v not in reachable:
+                assert path is None
+                continue
+            assert_walk(graph, path, u, v)
+            assert dfa.accepts([label for _, label, _ in path])
+            assert len(path) == lengths.path_length(u, v)
+    assert len(provenance._searches) == 2
+    assert 0 < lengths.nbytes < provenance.nbytes
+
+
+@pytest.mark.parametrize("regex, expected", [("c", set()), ("$", {0})])
+def test_rpq_no_common_labels(regex, expected):
+    graph = create_two_cycles_graph(3, 2)
+    provenance = RPQProvenance(regex, graph)
+
+    assert provenance.reachable(0) == expected
+    assert provenance.extract_path(0, 1) is None
+    assert provenance.path_length(0, 0) == (0 if expected else None)
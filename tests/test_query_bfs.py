@@ -1,6 +1,6 @@
 import pytest
 
-from project.dfa_utils import query_bfs
+from project.dfa_utils import query_bfs, query_bidirectional, query_many
 from project.graph import create_two_cycles_graph
 
 
@@ -18,3 +18,37 @@ def test_2():
 
     got = query_bfs(regex, graph, [0, 1], [0, 1], type=False)
     assert {0: {1}, 1: {0}} == got
+
+
+def test_batched_matches_single_source():
+    regex = r"a* b (a | b)*"
+    graph = create_two_cycles_graph(5, 4)
+    nodes = list(graph.nodes)
+
+    got = query_bfs(regex, graph, nodes, nodes, type=False)
+    assert got == {s: query_bfs(regex, graph, [s], nodes) for s in nodes}
+
+
+@pytest.mark.parametrize("regex", [r"a (a a | b b b)*", r"b* a", r"a*", r"c"])
+def test_bidirectional_matches_bfs(regex):
+    graph = create_two_cycles_graph(5, 4)
+    nodes = list(graph.nodes)
+
+    for u in nodes:
+        for v in nodes:
+            assert query_bidirectional(regex, graph, [u], [v]) == query_bfs(
+                regex, graph, [u], [v]
+            )
+    assert query_bidirectional(regex, graph, nodes, nodes, type=False) == query_bfs(
+        regex, graph, nodes, nodes, type=False
+    )
+
+
+@pytest.mark.parametrize("type", [True, False])
+def test_query_many_matches_query_bfs(type):
+    regexes = [r"a (a a | b b b)*", r"b* a", r"a*", r"c", r"(a | b)* b", r"a*"]
+    graph = create_two_cycles_graph(5, 4)
+    nodes = list(graph.nodes)
+
+    got = query_many(regexes, graph, nodes[:4], nodes, type=type)
+    assert got == [query_bfs(r, graph, nodes[:4], nodes, type=type) for r in regexes]
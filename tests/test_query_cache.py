@@ -0,0 +1,52 @@
+import tempfile
+
+from pyformlang.cfg import CFG
+
+from project.cfg import compile_grammar
+from project.dfa_utils import compile_regex, regex2dfa
+from project.query_cache import QueryCache
+
+
+def test_lru_eviction():
+    cache = QueryCache(maxsize=2)
+    calls = []
+
+    def compile(key):
+        return lambda: calls.append(key) or key
+
+    for key in ["a", "b", "a", "c", "b"]:
+        assert cache.get(key, compile(key)) == key
+
+    assert calls == ["a", "b", "c", "b"]
+    assert cache.info() == (1, 4, 2, 2)
+
+
+def test_compile_regex_normalized():
+    cache = QueryCache()
+    first = compile_regex("a  (b | c)*", cache)
+    second = compile_regex(" a (b | c)* ", cache)
+
+    assert first is second
+    assert cache.info().hits == 1
+    assert first.dfa.is_equivalent_to(regex2dfa("a (b | c)*"))
+    assert first.automaton.n_states == len(first.state_idx)
+
+
+def test_compile_grammar_order_independent():
+    cache = QueryCache()
+    first = compile_grammar(CFG.from_text("S -> a S b\nS -> epsilon"), cache)
+    second = compile_grammar(CFG.from_text("S -> epsilon\nS ->  a S b"), cache)
+
+    assert first is second
+    assert cache.info().misses == 1
+
+
+def test_persistence():
+    directory = tempfile.mkdtemp()
+    compiled = compile_regex("a b*", QueryCache(directory=directory))
+
+    warm = QueryCache(directory=directory)
+    restored = compile_regex("a b*", warm)
+    assert warm.info().misses == 0
+    assert restored.dfa.is_equivalent_to(compiled.dfa)
+    assert restored.automaton.n_states == compiled.automaton.n_states
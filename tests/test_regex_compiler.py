@@ -0,0 +1,83 @@
+import itertools
+import random
+
+import pytest
+
+from project.dfa_utils import regex2dfa, regex2dfa_native
+from project.regex_compiler import RegexSyntaxError, compile_minimal_dfa
+
+SYMBOLS = ["a", "b", "c", "ab", "$", "epsilon"]
+
+
+def random_regex(rng: random.Random, depth: int) -> str:
+    if depth == 0 or rng.random() < 0.25:
+        return rng.choice(SYMBOLS)
+    kind = rng.choice(["concat", "dot", "union", "plus", "star", "group"])
+    left = random_regex(rng, depth - 1)
+    if kind == "star":
+        return f"({left})*" if rng.random() < 0.5 else f"{left}*"
+    if kind == "group":
+        return f"({left})"
+    right = random_regex(rng, depth - 1)
+    operator = {"concat": " ", "dot": ".", "union": " | ", "plus": "+"}[kind]
+    return f"({left}{operator}{right})"
+
+
+def words(max_length: int):
+    for length in range(max_length + 1):
+        yield from itertools.product(["a", "b", "c", "ab"], repeat=length)
+
+
+def assert_same_language(expr: str):
+    expected = regex2dfa(expr)
+    got = regex2dfa_native(expr)
+    assert got.is_equivalent_to(expected), expr
+    assert len(got.states) == len(expected.states), expr
+    for word in words(4):
+        assert got.accepts(word) == expected.accepts(word), (expr, word)
+
+
+@pytest.mark.parametrize(
+    "expr",
+    [
+        "a b c",
+        "a.b.c",
+        "abc d*",
+        "(a|b)* a b b",
+        "a+b c*",
+        "a*b",
+        "a b*|c",
+        "a$b",
+        "$*",
+        "epsilon | a",
+        "a**",
+        "(a|$)b",
+        "a|",
+        "a.",
+        "",
+    ],
+)
+def test_native_matches_pyformlang(expr):
+    assert_same_language(expr)
+
+
+def test_native_matches_pyformlang_random():
+    rng = random.Random(0)
+    for _ in range(200):
+        assert_same_language(random_regex(rng, 4))
+
+
+def test_long_alternation():
+    labels = [f"l{i}" for i in range(2000)]
+    dfa = compile_minimal_dfa(f"({' | '.join(labels)})* l0")
+    assert dfa.n_states == 2
+    assert len(dfa.symbols) == 2000
+    matrices = dfa.to_matrices()
+    assert matrices["l0"].nnz == 2
+    assert matrices["l1"].nnz == 2
+
+
+@pytest.mark.parametrize("expr", ["(a", "a)", "*a"])
+def test_syntax_errors(expr):
+    with pytest.raises(RegexSyntaxError):
+        compile_minimal_dfa(expr)
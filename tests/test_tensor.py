@@ -0,0 +1,80 @@
+import networkx as nx
+import pytest
+from pyformlang.cfg import CFG, Variable
+
+from project.ecfg import ECFG
+from project.graph import (
+    create_two_cycles_graph,
+    hellings_cfpq,
+    query_cfg_graph,
+    tensor_cfpq,
+)
+
+GRAMMARS = [
+    """
+    S -> a b
+    """,
+    """
+    S -> A B
+    A -> a
+    B -> b
+    """,
+    """
+    S -> A B
+    S -> A S1
+    S1 -> S B
+    A -> a
+    B -> b
+    """,
+    """
+    S -> epsilon
+    S -> a S b
+    S -> S S
+    """,
+    """
+    S -> a S b S | epsilon
+    """,
+]
+
+
+@pytest.mark.parametrize("text", GRAMMARS)
+def test_tensor_matches_hellings(text: str):
+    cfg = CFG.from_text(text)
+    g = create_two_cycles_graph(3, 2)
+    nodes = list(g.nodes)
+
+    assert query_cfg_graph(
+        cfg, g, Variable("S"), nodes, nodes, algorithm="tensor"
+    ) == query_cfg_graph(cfg, g, Variable("S"), nodes, nodes)
+
+
+def test_tensor_from_ecfg():
+    ecfg = ECFG.from_text("S -> a S* b | a b")
+    g = create_two_cycles_graph(2, 1)
+    cfg = CFG.from_text("S -> a T b\nT -> S T | epsilon")
+
+    expected = {t for t in hellings_cfpq(cfg, g) if t[1] == Variable("S")}
+    assert {t for t in tensor_cfpq(ecfg, g) if t[1] == Variable("S")} == expected
+
+
+def test_tensor_multiple_sources():
+    cfg = CFG.from_text(GRAMMARS[2])
+    g = create_two_cycles_graph(2, 1)
+
+    result = tensor_cfpq(cfg, g, starts=[1], finals=[0, 3])
+    assert {(u, v) for u, var, v in result if var == Variable("S")} == {
+        (1, 0),
+        (1, 3),
+    }
+    assert all(u == 1 and v in (0, 3) for u, _, v in result)
+
+
+@pytest.mark.parametrize("text", GRAMMARS)
+def test_tensor_sources_match_all_pairs(text: str):
+    cfg = CFG.from_text(text)
+    g = nx.disjoint_union(create_two_cycles_graph(3, 2), create_two_cycles_graph(2, 4))
+
+    all_pairs = tensor_cfpq(cfg, g)
+    for starts in ([0], [1, 7], []):
+        expected = {fact for fact in all_pairs if fact[0] in starts}
+        assert tensor_cfpq(cfg, g, starts=starts) == expected